@@ -11,11 +11,66 @@ class __Cfg(Config):
     RNS_CONFIGDIR: str = required()
     NODE_IDENTITY_PATH: str = required()
     ANNOUNCE_NAME: str = optional("Waystone")
+    # starting limit of concurrent requests, adapted (AIMD) between MIN and MAX by latency
+    # and timeouts of known nodes; it isn't the amount of started threads any more
     CRAWLER_THREADS: int = optional(5)
+    CRAWLER_MIN_THREADS: int = optional(1)
+    # every crawl run starts this many downloader threads, idle ones wait for the limiter
+    CRAWLER_MAX_THREADS: int = optional(16)
+    CRAWLER_PARSE_PROCESSES: int = optional(0)
+    # nodes with higher dead probability are seeded only with CRAWLER_DEAD_NODE_PROBE_RATE chance
+    CRAWLER_SEED_DEAD_THRESHOLD: float = optional(0.8)
+    CRAWLER_DEAD_NODE_PROBE_RATE: float = optional(0.1)
+    # archive file, where crawl responses are recorded for replay benchmarks, empty - off
+    CRAWLER_RECORD_PATH: str = optional("")
+    # compressed raw pages, kept for reindexing without recrawl, 0 - off.
+    # Costs a zlib compression, a blob file write and a database upsert per fetched page
+    # on crawler threads, plus the disk space itself
+    CRAWLER_PAGE_STORE_MAX_BYTES: int = optional(0)
+    # bigger responses are cancelled, when their size is advertised, 0 - unlimited
+    CRAWLER_MAX_PAGE_BYTES: int = optional(512 * 1024)
+    # indexed text of a page is truncated to this length, 0 - unlimited
+    CRAWLER_MAX_TEXT_CHARS: int = optional(100_000)
     CRAWLER_QUEUE_MAXSIZE: int = optional(5000)
     CRAWLER_VISITED_CACHE_SECONDS: int = optional(24 * 60 * 60)
+    CRAWLER_RECRAWL_MIN_SECONDS: int = optional(60 * 60)
+    CRAWLER_RECRAWL_MAX_SECONDS: int = optional(14 * 24 * 60 * 60)
+    # comma separated link field names, that don't change page ("*" drops all fields)
+    CRAWLER_URL_VOLATILE_PARAMS: str = optional(
+        "auth_token,token,session,session_id,sid,nonce,timestamp,ts,rand,random"
+    )
+    CRAWLER_MAX_URL_LENGTH: int = optional(512)
+    # per destination and crawl run, 0 - unlimited
+    CRAWLER_NODE_MAX_REQUESTS: int = optional(300)
+    CRAWLER_NODE_MAX_BYTES: int = optional(10 * 1024 * 1024)
+    # all crawler downloads, 0 - unlimited
+    CRAWLER_BANDWIDTH_BYTES_PER_SECOND: int = optional(0)
+    # destinations, that failed path discovery or link, are skipped for backoff doubling with
+    # every failure; base is not shorter than the hourly crawl, so a dead node isn't retried
+    # in every run
+    CRAWLER_UNREACHABLE_BACKOFF_SECONDS: int = optional(60 * 60)
+    CRAWLER_UNREACHABLE_MAX_BACKOFF_SECONDS: int = optional(24 * 60 * 60)
+    CRAWLER_REQUEST_TIMEOUT: int = optional(20)
+    CRAWLER_REQUEST_TIMEOUT_MIN: int = optional(5)
+    CRAWLER_REQUEST_TIMEOUT_MAX: int = optional(60)
     NODE_REMOVE_AFTER_DAYS: int = optional(14)
     NOMAD_NODE_ANNOUNCE_LOG_KEEP_DAYS: int = optional(14)
+    # search queries and user history are written in background, the last interval may be lost
+    SEARCH_LOG_FLUSH_SECONDS: int = optional(5)
+    SEARCH_LOG_MAX_ENTRIES: int = optional(1000)
+    # distinct queries kept in search stats, the least recently searched are pruned daily
+    SEARCH_QUERY_STATS_MAX_ROWS: int = optional(10_000)
+    # node and peer lookups of crawler and pages
+    DIRECTORY_CACHE_MAX_ENTRIES: int = optional(10_000)
+    DIRECTORY_CACHE_TTL_SECONDS: int = optional(60)
+    # announces are written in batches, when interval passes or buffer is full
+    ANNOUNCE_FLUSH_INTERVAL_MS: int = optional(500)
+    ANNOUNCE_FLUSH_MAX_ENTRIES: int = optional(500)
+    # WAL lets readers work while crawler and announces write, DELETE - rollback journal
+    SQLITE_JOURNAL_MODE: str = optional("WAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = optional(5000)
+    SQLITE_MMAP_BYTES: int = optional(256 * 1024 * 1024)
+    SQLITE_CACHE_KIB: int = optional(16 * 1024)
 
     TEMPLATES_DIR: str = required()
     LOG_PATH: str = optional("logs")
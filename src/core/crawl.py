@@ -1,6 +1,10 @@
 import asyncio
+import hashlib
 import logging
-import re
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 import typing as tp
 from typing import Callable
@@ -10,90 +14,231 @@ import RNS
 from src.core.search import SearchDocument
 from src.core.search import engine as search_engine
 from src.config import CONFIG
-from src.core.crawler.crawler import Crawler
-from src.core.crawler.parser import extract_links
-from src.core.crawler.rns_request import address_from_url, request
-from src.core.data.nods_and_peers import get_recent_nodes_for_crawl
+from src.core.crawler.budget import CrawlBudget, TokenBucket
+from src.core.crawler.concurrency import AimdLimiter
+from src.core.crawler.crawler import Crawler, SkipUrl
+from src.core.crawler.latency import latency_tracker
+from src.core.crawler.liveness import UNKNOWN_P_DEAD, ProbeLog, calibration, plan_seeds
+from src.core.crawler.memory import in_flight_pages
+from src.core.crawler.page_store import page_store
+from src.core.crawler.parser import ParsedPage, parse_page
+from src.core.crawler.replay import (
+    OUTCOME_ERROR,
+    OUTCOME_NONE,
+    OUTCOME_OK,
+    OUTCOME_SKIPPED,
+    ArchiveEntry,
+    ArchiveRecorder,
+    replay,
+)
+from src.core.crawler.rns_request import (
+    DestinationUnreachable,
+    RequestTrace,
+    ResponseTooLarge,
+    address_from_url,
+    request,
+)
+from src.core.crawler import telemetry as stages
+from src.core.crawler.telemetry import CrawlTelemetry
+from src.core.crawler.urls import canonicalizer
+from src.core.data.citations import CitationBatch
+from src.core.data.crawl_reachability import save_reachability_samples
+from src.core.data.nods_and_peers import get_node_dead_probabilities, get_recent_nodes_for_crawl
 
 logger = logging.getLogger("crawler")
-
-# Компилируем регулярки один раз
-_RE_FB = re.compile(r"`[fb]")
-_RE_FB_CAPS = re.compile(r"`[FB]...")
-_RE_TAGS = re.compile(r"`<[^>]*>")
-_RE_COMMENT = re.compile(r"#.*$", flags=re.MULTILINE)
-_RE_GT_LINE_START = re.compile(r"^\s*>+", flags=re.MULTILINE)
-_RE_SPACES = re.compile(r"[ \t]+")
-_RE_PARAGRAPH = re.compile(r"\n\s*\n+")
-
-# Символы для удаления как `x`
-_MICRON_CHARS = "car!_=`"
-
-
-def strip_micron(text: str) -> str:
-    text = _RE_FB.sub("", text)
-    text = _RE_FB_CAPS.sub("", text)
-
-    for t in _MICRON_CHARS:
-        text = text.replace(f"`{t}", "")
-
-    text = _RE_TAGS.sub(" ", text)
-    text = _RE_COMMENT.sub("", text)
-    text = _RE_GT_LINE_START.sub("", text)
-    text = text.replace("\\", " ")
-    text = _RE_SPACES.sub(" ", text)
-    text = _RE_PARAGRAPH.sub("\n\n", text)
-    text = text.replace("`", "")
-
-    return text
+# frontier is shared between runs, so two crawlers mustn't work at the same time
+_crawl_lock = threading.Lock()
 
 
 @dataclass
 class Document:
     url: str
     response: RNS.RequestReceipt | None
+    content_hash: str | None = None
 
-    def get_info(self) -> tuple[RNS.Link | None, str | None]:
+    def get_info(self) -> tuple[RNS.Link | None, bytes | None]:
         if self.response is None:
             return None, None
         response = self.response
         # Explicitly release receipt reference to reduce retained memory.
         self.response = None
-        try:
-            text = response.response.decode("utf-8")
-        except Exception:
+        raw = response.response
+        if not isinstance(raw, bytes):
             logging.debug("Empty document")
-            text = None
-        return response.link, text
+            raw = None
+        return response.link, raw
 
 
-def load(url: str) -> Document | None:
+def load(
+        url: str,
+        limiter: AimdLimiter | None = None,
+        budget: CrawlBudget | None = None,
+        bandwidth: TokenBucket | None = None,
+        probes: ProbeLog | None = None,
+        telemetry: CrawlTelemetry | None = None,
+) -> Document | None:
+    if ".mu" not in url:
+        logger.debug("skipping url %s", url)
+        return None
+    address = address_from_url(url)
+    if budget and not budget.try_request(address):
+        logger.debug("skipping %s, crawl budget of the node is exhausted", url)
+        return None
+    # timeouts of never reached nodes say nothing about congestion, only known ones are reported
+    known = latency_tracker.get(address)
+    load_started_at = time.time()
+    trace = RequestTrace()
+    if bandwidth:
+        bandwidth.wait()
+    if limiter:
+        limiter.acquire()
+    started_at = time.time()
     try:
-        if ".mu" not in url:
-            logger.debug("skipping url %s", url)
-            return None
-        res = request(url)
-        return Document(url, res)
+        res = request(url, max_size=CONFIG.CRAWLER_MAX_PAGE_BYTES or None, trace=trace)
+    except ResponseTooLarge as e:
+        in_flight_pages.rejected()
+        if probes:
+            probes.reached(address)
+        # not fetched again until the longest recrawl interval passes
+        raise SkipUrl(f"page is too large ({e.size} bytes)")
     except asyncio.exceptions.TimeoutError:
         logger.debug("loading %s failed due to timeout", url)
+        if probes:
+            probes.attempted(address)
+        if limiter and known:
+            limiter.record_timeout()
         return None
+    except DestinationUnreachable:
+        logger.debug("skipping %s, destination is in unreachable backoff", url)
+        return None
+    finally:
+        if limiter:
+            limiter.release()
+        if telemetry:
+            _observe_request(telemetry, address, load_started_at, trace)
+    if probes:
+        probes.reached(address)
+    if limiter and known:
+        limiter.record_latency((time.time() - started_at) / max(known.expected_seconds, 0.1))
+    content_hash = None
+    if isinstance(res.response, bytes):
+        content_hash = hashlib.sha1(res.response).hexdigest()
+        in_flight_pages.acquire(url, len(res.response))
+        if budget:
+            budget.charge(address, len(res.response))
+        if bandwidth:
+            bandwidth.charge(len(res.response))
+    return Document(url, res, content_hash)
+
+
+def _observe_request(
+        telemetry: CrawlTelemetry, address: str, load_started_at: float, trace: RequestTrace
+) -> None:
+    if not trace.started_at:
+        return
+    telemetry.observe(stages.STAGE_WAIT, trace.started_at - load_started_at, address)
+    # unfinished stage (timeout) takes time till now
+    end = trace.finished_at or time.time()
+    previous = trace.started_at
+    for stage, at in (
+            (stages.STAGE_PATH, trace.path_found_at),
+            (stages.STAGE_LINK, trace.link_established_at),
+            (stages.STAGE_REQUEST, trace.finished_at),
+    ):
+        telemetry.observe(stage, (at or end) - previous, address)
+        if at is None:
+            break
+        previous = at
+
+
+def recording_loader(
+        load_url: Callable[[str], Document | None], recorder: ArchiveRecorder
+) -> Callable[[str], Document | None]:
+    def load_and_record(url: str) -> Document | None:
+        started_at = time.time()
+        try:
+            doc = load_url(url)
+        except SkipUrl:
+            recorder.record(ArchiveEntry(url, time.time() - started_at, OUTCOME_SKIPPED))
+            raise
+        except Exception:
+            recorder.record(ArchiveEntry(url, time.time() - started_at, OUTCOME_ERROR))
+            raise
+        entry = ArchiveEntry(url, time.time() - started_at, OUTCOME_NONE)
+        if doc is not None and doc.response is not None:
+            entry.outcome = OUTCOME_OK
+            entry.response = doc.response.response
+            identity = doc.response.link.get_remote_identity() if doc.response.link else None
+            entry.owner = identity.hexhash if identity else None
+        recorder.record(entry)
+        return doc
+
+    return load_and_record
+
+
+def replay_loader(
+        archive: dict[str, ArchiveEntry], latency_scale: float = 1.0
+) -> Callable[[str], Document | None]:
+    """Serves recorded responses instead of RNS requests."""
+
+    def load_recorded(url: str) -> Document | None:
+        entry = archive.get(url)
+        receipt = replay(entry, latency_scale)
+        if entry is not None and entry.outcome == OUTCOME_SKIPPED:
+            raise SkipUrl("skipped, when recorded")
+        if receipt is None:
+            return None
+        content_hash = hashlib.sha1(receipt.response).hexdigest() if receipt.response else None
+        return Document(url, receipt, content_hash)
+
+    return load_recorded
+
+
+def _parse_page(address: str, raw: bytes) -> ParsedPage | None:
+    return parse_page(address, raw, CONFIG.CRAWLER_MAX_TEXT_CHARS)
 
 
 def extract(
         doc: Document | None,
         get_name_by_address: Callable[[str], str | None] | None = None,
         update_citations: Callable[[str, tp.List[str]], None] | None = None,
+        parse: Callable[[str, bytes], ParsedPage | None] = _parse_page,
+        telemetry: CrawlTelemetry | None = None,
 ) -> tp.List[str]:
     if not doc:
         return []
-    link, text = doc.get_info()
-    if not link or not text:
+    try:
+        return _extract_document(
+            doc, get_name_by_address, update_citations, parse, telemetry or CrawlTelemetry()
+        )
+    finally:
+        in_flight_pages.release(doc.url)
+
+
+def _extract_document(
+        doc: Document,
+        get_name_by_address: Callable[[str], str | None] | None,
+        update_citations: Callable[[str, tp.List[str]], None] | None,
+        parse: Callable[[str, bytes], ParsedPage | None],
+        telemetry: CrawlTelemetry,
+) -> tp.List[str]:
+    link, raw = doc.get_info()
+    if not link or not raw:
         return []
     remote_identity: RNS.Identity = link.get_remote_identity()
     address = address_from_url(doc.url)
+    with telemetry.measure(stages.STAGE_PARSE, address):
+        parsed = parse(address, raw)
+    if parsed is None:
+        logging.debug("Empty document")
+        return []
+    plain_text, internal_links, external_links = parsed
+    with telemetry.measure(stages.STAGE_STORE, address):
+        page_store.put(doc.url, remote_identity.hexhash, raw, doc.content_hash)
+    del raw, parsed
     index_entry = SearchDocument(
         url=doc.url,
-        text=strip_micron(text),
+        text=plain_text,
         owner=remote_identity.hexhash,
         address=address,
         nodeName=None,
@@ -104,11 +249,14 @@ def extract(
         if nodeName:
             index_entry.nodeName = nodeName
 
-    search_engine.queue_document(index_entry)
-    internal_links, external_links = extract_links(address, text)
+    with telemetry.measure(stages.STAGE_INDEX, address):
+        search_engine.queue_document(index_entry)
 
     if update_citations:
-        update_citations(doc.url, external_links)
+        # links to files etc. aren't crawled, but are still citations
+        update_citations(
+            doc.url, [canonicalizer.canonicalize(url) or url for url in external_links]
+        )
 
     logging.getLogger("crawler").debug(
         "Extracted %s internal, %s external links from %s",
@@ -119,26 +267,173 @@ def extract(
     return internal_links + external_links
 
 
+def _report_reachability(started_at: float, p_dead: dict[str, float], probes: ProbeLog) -> None:
+    samples = [
+        (address, p_dead[address], reached)
+        for address, reached in probes.outcomes().items()
+        if address in p_dead
+    ]
+    if not samples:
+        return
+    save_reachability_samples(started_at, samples)
+    predicted, observed, brier = calibration([(p, reached) for _, p, reached in samples])
+    logging.getLogger("crawl-scheduler").info(
+        "reachability of %s nodes: predicted dead %.2f, unreachable %.2f, brier score %.3f",
+        len(samples),
+        predicted,
+        observed,
+        brier,
+    )
+
+
+def _seed_cost(address: str) -> float:
+    """
+    Expected seconds per successful page. Unknown nodes go first, slow and flaky ones last.
+    """
+    stats = latency_tracker.get(address)
+    if stats is None:
+        return 0.0
+    return stats.expected_seconds / max(stats.success_rate, 0.05)
+
+
 def crawl(
         get_node_by_address: Callable[[str], str],
-        update_citations: Callable[[str, tp.List[str]], None],
+        update_pages: Callable[[tp.Dict[str, tp.Iterable[str]]], None],
+):
+    if not _crawl_lock.acquire(blocking=False):
+        logging.getLogger("crawl-scheduler").warning("Previous crawl is still running, skipping")
+        return
+    try:
+        _crawl(get_node_by_address, update_pages)
+    finally:
+        _crawl_lock.release()
+
+
+def _crawl(
+        get_node_by_address: Callable[[str], str],
+        update_pages: Callable[[tp.Dict[str, tp.Iterable[str]]], None],
+):
+    limiter = AimdLimiter(
+        min_limit=CONFIG.CRAWLER_MIN_THREADS,
+        max_limit=CONFIG.CRAWLER_MAX_THREADS,
+        initial=CONFIG.CRAWLER_THREADS,
+    )
+    budget = CrawlBudget(
+        max_requests=CONFIG.CRAWLER_NODE_MAX_REQUESTS,
+        max_bytes=CONFIG.CRAWLER_NODE_MAX_BYTES,
+    )
+    bandwidth = TokenBucket(
+        rate=CONFIG.CRAWLER_BANDWIDTH_BYTES_PER_SECOND,
+        # one big page may pass without waiting
+        burst=max(CONFIG.CRAWLER_BANDWIDTH_BYTES_PER_SECOND, 64 * 1024),
+    )
+    parse: Callable[[str, bytes], ParsedPage | None] = _parse_page
+    if CONFIG.CRAWLER_PARSE_PROCESSES > 0:
+        # spawn: workers don't inherit RNS threads and locks. Besides parser modules they
+        # import only the main module (as __mp_main__), so it must be free of side effects
+        pool = ProcessPoolExecutor(
+            max_workers=CONFIG.CRAWLER_PARSE_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        parse = lambda address, raw: pool.submit(
+            parse_page, address, raw, CONFIG.CRAWLER_MAX_TEXT_CHARS
+        ).result()
+    else:
+        pool = None
+    recorder = ArchiveRecorder(CONFIG.CRAWLER_RECORD_PATH) if CONFIG.CRAWLER_RECORD_PATH else None
+    try:
+        _run_crawler(
+            get_node_by_address, update_pages, limiter, budget, bandwidth, parse, recorder
+        )
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if recorder is not None:
+            recorder.close()
+
+
+def _run_crawler(
+        get_node_by_address: Callable[[str], str],
+        update_pages: Callable[[tp.Dict[str, tp.Iterable[str]]], None],
+        limiter: AimdLimiter,
+        budget: CrawlBudget,
+        bandwidth: TokenBucket,
+        parse: Callable[[str, bytes], ParsedPage | None],
+        recorder: ArchiveRecorder | None,
 ):
     logger = logging.getLogger("crawl-scheduler")
+    telemetry = CrawlTelemetry()
+    started_at = telemetry.started_at
+    p_dead = get_node_dead_probabilities()
+    probes = ProbeLog()
+    # citations are applied per node after crawl, with links of its crawled pages
+    citation_batch = CitationBatch()
+    load_url = lambda url: load(url, limiter, budget, bandwidth, probes, telemetry)
+    if recorder:
+        load_url = recording_loader(load_url, recorder)
     crawler = Crawler(
-        load,
-        lambda doc: extract(doc, get_node_by_address, update_citations),
+        load_url,
+        lambda doc: extract(doc, get_node_by_address, citation_batch.add, parse, telemetry),
         queue_maxsize=CONFIG.CRAWLER_QUEUE_MAXSIZE,
         visited_cache_seconds=CONFIG.CRAWLER_VISITED_CACHE_SECONDS,
+        recrawl_min_seconds=CONFIG.CRAWLER_RECRAWL_MIN_SECONDS,
+        recrawl_max_seconds=CONFIG.CRAWLER_RECRAWL_MAX_SECONDS,
+        fingerprint=lambda doc: doc.content_hash if doc else None,
+        canonicalize=canonicalizer.canonicalize,
+        # probably dead nodes go last, so threads are busy with live ones first
+        priority=lambda url: round(p_dead.get(address_from_url(url), UNKNOWN_P_DEAD), 1),
     )
     recent_nodes = get_recent_nodes_for_crawl(within_seconds=CONFIG.CRAWLER_VISITED_CACHE_SECONDS)
-    if not recent_nodes:
+    if not recent_nodes and not crawler.has_pending():
         logger.warning("No known nodes to crawl")
         return
     logger.info("starting crawl")
-    for dst in recent_nodes:
+    seeds, skipped = plan_seeds(
+        sorted(recent_nodes, key=_seed_cost),
+        p_dead,
+        dead_threshold=CONFIG.CRAWLER_SEED_DEAD_THRESHOLD,
+        probe_rate=CONFIG.CRAWLER_DEAD_NODE_PROBE_RATE,
+    )
+    for dst in seeds:
         crawler.add_url(dst + ":/page/index.mu")
-    logger.info("enqueued %s urls", len(recent_nodes))
-    crawler.start(CONFIG.CRAWLER_THREADS)
+    seed_addresses = set(seeds)
+    due = crawler.add_due_urls(lambda url: address_from_url(url) in seed_addresses)
+    logger.info(
+        "enqueued %s seed urls and %s due urls, skipped %s probably dead nodes",
+        len(seeds),
+        due,
+        skipped,
+    )
+    crawler.start(limiter.max_limit)
     crawler.join()
+    logger.info(
+        "concurrency limit at the end of crawl: %s (min %s, max %s)",
+        limiter.limit,
+        limiter.min_limit,
+        limiter.max_limit,
+    )
+    exhausted = budget.exhausted()
+    if exhausted:
+        logger.info(
+            "crawl budget exhausted for %s nodes: %s",
+            len(exhausted),
+            ", ".join(
+                f"{address} ({usage.requests} requests, {usage.bytes} bytes, {usage.denied} skipped)"
+                for address, usage in sorted(exhausted.items(), key=lambda i: -i[1].denied)
+            ),
+        )
+    if bandwidth.waited_seconds:
+        logger.info("waited %.1fs in total for bandwidth limit", bandwidth.waited_seconds)
+    _report_reachability(started_at, p_dead, probes)
+
+    def update_node_citations(pages: tp.Dict[str, tp.Iterable[str]]) -> None:
+        with telemetry.measure(stages.STAGE_CITATIONS, address_from_url(next(iter(pages)))):
+            update_pages(pages)
+
+    updated = citation_batch.apply(update_node_citations)
+    logger.info("updated citations of %s nodes", updated)
     # Flush any remaining batched documents after crawl completion.
-    search_engine.flush_index_queue()
+    with telemetry.measure(stages.STAGE_INDEX):
+        search_engine.flush_index_queue()
+    telemetry.log_summary()
+    telemetry.save()
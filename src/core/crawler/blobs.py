@@ -0,0 +1,18 @@
+"""
+Page store blob files. Imports nothing from the project: reindex workers read blobs
+themselves and must not load config, logging handlers or database engines.
+"""
+import os
+import zlib
+
+
+def blob_path(root: str, content_hash: str) -> str:
+    return os.path.join(root, content_hash[:2], content_hash[2:] + ".z")
+
+
+def read_blob(root: str, content_hash: str) -> bytes | None:
+    try:
+        with open(blob_path(root, content_hash), "rb") as f:
+            return zlib.decompress(f.read())
+    except (OSError, zlib.error):
+        return None
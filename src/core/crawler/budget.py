@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+
+class TokenBucket:
+    """
+    Global bandwidth limit in bytes per second. Response size is known only after
+    download, so bytes are charged afterwards and the bucket may go into debt:
+    next requests wait until it is paid off.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        """
+        :param rate: bytes per second, 0 disables the limit
+        """
+        self.__cond = threading.Condition()
+        self._rate = max(0.0, float(rate))
+        self._burst = max(1.0, float(burst))
+        self._tokens = self._burst
+        self._updated_at = time.monotonic()
+        self.waited_seconds = 0.0
+
+    def _refill_locked(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    def wait(self) -> None:
+        if not self._rate:
+            return
+        with self.__cond:
+            self._refill_locked()
+            started_at = time.monotonic()
+            while self._tokens < 0:
+                self.__cond.wait(-self._tokens / self._rate)
+                self._refill_locked()
+            self.waited_seconds += time.monotonic() - started_at
+
+    def charge(self, size: int) -> None:
+        if not self._rate:
+            return
+        with self.__cond:
+            self._refill_locked()
+            self._tokens -= size
+
+
+@dataclass
+class NodeUsage:
+    requests: int = 0
+    bytes: int = 0
+    denied: int = 0
+
+
+class CrawlBudget:
+    """
+    Per-destination request and byte budgets of one crawl run, so a node with generated
+    pages can't take the whole run. 0 disables a limit.
+    """
+
+    def __init__(self, max_requests: int, max_bytes: int):
+        self.__lock = threading.Lock()
+        self._logger = logging.getLogger("crawler-budget")
+        self._max_requests = max(0, int(max_requests))
+        self._max_bytes = max(0, int(max_bytes))
+        self._usage: dict[str, NodeUsage] = {}
+
+    def _is_exhausted(self, usage: NodeUsage) -> bool:
+        return bool(
+            (self._max_requests and usage.requests >= self._max_requests)
+            or (self._max_bytes and usage.bytes >= self._max_bytes)
+        )
+
+    def try_request(self, address: str) -> bool:
+        """
+        Counts request to destination, if its budget isn't exhausted.
+        """
+        with self.__lock:
+            usage = self._usage.setdefault(address, NodeUsage())
+            if self._is_exhausted(usage):
+                if not usage.denied:
+                    self._logger.debug(
+                        "budget of %s is exhausted: %s requests, %s bytes",
+                        address,
+                        usage.requests,
+                        usage.bytes,
+                    )
+                usage.denied += 1
+                return False
+            usage.requests += 1
+            return True
+
+    def charge(self, address: str, size: int) -> None:
+        with self.__lock:
+            self._usage.setdefault(address, NodeUsage()).bytes += size
+
+    def exhausted(self) -> dict[str, NodeUsage]:
+        """
+        :return: destinations, which requests were denied, with their usage
+        """
+        with self.__lock:
+            return {
+                address: NodeUsage(usage.requests, usage.bytes, usage.denied)
+                for address, usage in self._usage.items()
+                if usage.denied
+            }
@@ -0,0 +1,89 @@
+import logging
+import threading
+
+
+class AimdLimiter:
+    """
+    Limit of in-flight requests with additive increase / multiplicative decrease.
+
+    Outcomes are evaluated in windows of ``window`` requests. A window with too many
+    timeouts or with inflated latency (observed time relative to destination's usual
+    time) halves the limit, a healthy window raises it by one.
+    """
+
+    def __init__(
+            self,
+            min_limit: int,
+            max_limit: int,
+            initial: int,
+            window: int = 10,
+            max_timeout_rate: float = 0.2,
+            max_latency_inflation: float = 2.0,
+            decrease_factor: float = 0.5,
+    ):
+        self.__cond = threading.Condition()
+        self._logger = logging.getLogger("crawler-concurrency")
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self._limit = min(self.max_limit, max(self.min_limit, int(initial)))
+        self._in_flight = 0
+        self._window = max(1, int(window))
+        self._max_timeout_rate = max_timeout_rate
+        self._max_latency_inflation = max_latency_inflation
+        self._decrease_factor = decrease_factor
+        self._timeouts = 0
+        self._latency_ratios: list[float] = []
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def acquire(self) -> None:
+        with self.__cond:
+            while self._in_flight >= self._limit:
+                self.__cond.wait()
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self.__cond:
+            self._in_flight -= 1
+            self.__cond.notify()
+
+    def record_timeout(self) -> None:
+        with self.__cond:
+            self._timeouts += 1
+            self._maybe_adjust_locked()
+
+    def record_latency(self, ratio: float) -> None:
+        """
+        :param ratio: observed request time divided by expected time for the destination
+        """
+        with self.__cond:
+            self._latency_ratios.append(ratio)
+            self._maybe_adjust_locked()
+
+    def _maybe_adjust_locked(self) -> None:
+        total = self._timeouts + len(self._latency_ratios)
+        if total < self._window:
+            return
+        timeout_rate = self._timeouts / total
+        inflation = (
+            sum(self._latency_ratios) / len(self._latency_ratios) if self._latency_ratios else 0.0
+        )
+        self._timeouts = 0
+        self._latency_ratios = []
+
+        old_limit = self._limit
+        if timeout_rate > self._max_timeout_rate or inflation > self._max_latency_inflation:
+            self._limit = max(self.min_limit, int(self._limit * self._decrease_factor))
+        else:
+            self._limit = min(self.max_limit, self._limit + 1)
+        if self._limit != old_limit:
+            self._logger.debug(
+                "concurrency %s -> %s (timeout rate %.2f, latency inflation %.2f)",
+                old_limit,
+                self._limit,
+                timeout_rate,
+                inflation,
+            )
+            self.__cond.notify_all()
@@ -1,31 +1,99 @@
 import datetime
+import itertools
 import logging
-import random
 import threading
 import time
 import typing as tp
-from contextlib import contextmanager
-from queue import Empty, Queue
+from queue import Full, PriorityQueue, Queue
 from threading import Thread
-from time import sleep
 
-from sqlalchemy import select
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from src.core.data.db import get_session
-from src.core.data.models import CrawlVisitedUrl
+from src.core.data.models import CrawlFrontierUrl, CrawlVisitedUrl
 
 Document = tp.TypeVar("Document")
 Loader = tp.Callable[[str], Document]
 Extractor = tp.Callable[[Document], tp.List[str]]
+Fingerprint = tp.Callable[[Document], tp.Optional[str]]
+Canonicalizer = tp.Callable[[str], tp.Optional[str]]
+# lower priority is crawled first
+Priority = tp.Callable[[str], float]
+
+# urls per IN (...) clause, below SQLite variables limit
+_SQL_CHUNK = 500
+
+
+class SkipUrl(Exception):
+    """
+    Raised by loader for urls, which are reachable, but can't be crawled (e.g. too large
+    pages). They are retried after the longest recrawl interval, not in every run.
+    """
 
 
 class _DbVisitedSet:
-    def __init__(self, cache_seconds: int):
+    """
+    Per-url recrawl schedule. Interval grows while page is found unchanged and shrinks,
+    when it changes, so static pages are fetched rarely and churny ones stay fresh.
+    """
+
+    UNCHANGED_FACTOR = 1.5
+    CHANGED_FACTOR = 0.5
+
+    def __init__(self, cache_seconds: int, min_interval: int, max_interval: int):
         self.__lock = threading.Lock()
         self.__logger = logging.getLogger("crawler-visited")
         self._cache_seconds = max(1, int(cache_seconds))
+        self._min_interval = max(1, int(min_interval))
+        self._max_interval = max(self._min_interval, int(max_interval))
+
+    def due(self, urls: tp.Sequence[str]) -> tp.List[str]:
+        """
+        :return: urls, which are never visited or which recrawl time has come, in given order
+        """
+        schedule = {}
+        with get_session() as session:
+            for i in range(0, len(urls), _SQL_CHUNK):
+                rows = session.execute(
+                    select(
+                        CrawlVisitedUrl.url,
+                        CrawlVisitedUrl.last_visited_at,
+                        CrawlVisitedUrl.next_visit_at,
+                    ).where(CrawlVisitedUrl.url.in_(urls[i:i + _SQL_CHUNK]))
+                ).all()
+                schedule.update((url, (last_ts, next_ts)) for url, last_ts, next_ts in rows)
+        now_ts = time.time()
+        due = []
+        for url in urls:
+            if url in schedule:
+                last_ts, next_ts = schedule[url]
+                if next_ts is None:
+                    next_ts = last_ts + self._cache_seconds
+                if now_ts < next_ts:
+                    continue
+            due.append(url)
+        return due
 
-    def add_if_missing(self, url: str) -> bool:
+    def due_urls(self) -> tp.List[str]:
+        now_ts = time.time()
+        with get_session() as session:
+            rows = session.execute(
+                select(CrawlVisitedUrl.url)
+                .where(
+                    or_(
+                        CrawlVisitedUrl.next_visit_at <= now_ts,
+                        and_(
+                            CrawlVisitedUrl.next_visit_at.is_(None),
+                            CrawlVisitedUrl.last_visited_at <= now_ts - self._cache_seconds,
+                        ),
+                    )
+                )
+                .order_by(CrawlVisitedUrl.next_visit_at)
+            ).scalars().all()
+        return list(rows)
+
+    def mark_visited(self, url: str, content_hash: str | None = None) -> None:
         with self.__lock:
             with get_session() as session:
                 now_ts = time.time()
@@ -38,19 +106,146 @@ class _DbVisitedSet:
                             url=url,
                             created_at=now_ts,
                             last_visited_at=now_ts,
+                            content_hash=content_hash,
+                            recrawl_interval=self._cache_seconds,
+                            next_visit_at=now_ts + self._cache_seconds,
                         )
                     )
-                    return True
+                    return
+
+                interval = existing.recrawl_interval or self._cache_seconds
+                if content_hash is not None and existing.content_hash is not None:
+                    if content_hash == existing.content_hash:
+                        interval *= self.UNCHANGED_FACTOR
+                    else:
+                        interval *= self.CHANGED_FACTOR
+                interval = min(self._max_interval, max(self._min_interval, interval))
+                self.__logger.debug("%s: recrawl interval %.0fs", url, interval)
+
+                existing.last_visited_at = now_ts
+                if content_hash is not None:
+                    existing.content_hash = content_hash
+                existing.recrawl_interval = interval
+                existing.next_visit_at = now_ts + interval
 
-                last_ts = existing.last_visited_at or existing.created_at
-                if now_ts - last_ts < self._cache_seconds:
-                    return False
+
+    def mark_skipped(self, url: str) -> None:
+        with self.__lock:
+            with get_session() as session:
+                now_ts = time.time()
+                existing = session.execute(
+                    select(CrawlVisitedUrl).where(CrawlVisitedUrl.url == url)
+                ).scalars().first()
+                if existing is None:
+                    existing = CrawlVisitedUrl(url=url, created_at=now_ts)
+                    session.add(existing)
                 existing.last_visited_at = now_ts
-                return True
+                existing.recrawl_interval = self._max_interval
+                existing.next_visit_at = now_ts + self._max_interval
+
+
+class _DbFrontier:
+    """
+    Disk-backed part of crawl queue. Every pending url is stored here until it is processed,
+    so urls, that didn't fit into in-memory queue or were left by stopped process, aren't lost.
+    Rows with in_queue=True are currently in memory queue (or being downloaded).
+    """
+
+    def __init__(self):
+        self.__logger = logging.getLogger("crawler-frontier")
+
+    def resume(self) -> int:
+        """
+        Returns urls, claimed by previous crawler, back to frontier.
+
+        :return: amount of pending urls
+        """
+        with get_session() as session:
+            session.execute(update(CrawlFrontierUrl).values(in_queue=False))
+            pending = int(session.execute(select(func.count(CrawlFrontierUrl.id))).scalar_one())
+        if pending:
+            self.__logger.info("resuming %s urls from frontier", pending)
+        return pending
+
+    def add(
+            self, urls: tp.Sequence[tp.Tuple[str, float]], source_url: str
+    ) -> tp.List[tp.Tuple[str, float]]:
+        """
+        Adds urls with their priorities as claimed (in_queue=True).
+
+        :return: added urls, without already pending ones
+        """
+        if not urls:
+            return []
+        with get_session() as session:
+            pending = set()
+            for i in range(0, len(urls), _SQL_CHUNK):
+                pending.update(
+                    session.execute(
+                        select(CrawlFrontierUrl.url).where(
+                            CrawlFrontierUrl.url.in_([url for url, _ in urls[i:i + _SQL_CHUNK]])
+                        )
+                    ).scalars()
+                )
+            added = [(url, priority) for url, priority in urls if url not in pending]
+            if added:
+                now_ts = time.time()
+                session.execute(
+                    sqlite_insert(CrawlFrontierUrl).on_conflict_do_nothing(index_elements=["url"]),
+                    [
+                        dict(
+                            url=url,
+                            source_url=source_url,
+                            created_at=now_ts,
+                            in_queue=True,
+                            priority=priority,
+                        )
+                        for url, priority in added
+                    ],
+                )
+            return added
+
+    def release(self, urls: tp.Sequence[str]) -> None:
+        """Returns claimed urls, that didn't fit into memory queue, to frontier."""
+        with get_session() as session:
+            for i in range(0, len(urls), _SQL_CHUNK):
+                session.execute(
+                    update(CrawlFrontierUrl)
+                    .where(CrawlFrontierUrl.url.in_(urls[i:i + _SQL_CHUNK]))
+                    .values(in_queue=False)
+                )
+
+    def claim(self, limit: int) -> tp.List[tp.Tuple[str, float]]:
+        """
+        :return: urls with their priorities, the most urgent first
+        """
+        if limit <= 0:
+            return []
+        with get_session() as session:
+            rows = session.execute(
+                select(CrawlFrontierUrl.id, CrawlFrontierUrl.url, CrawlFrontierUrl.priority)
+                .where(CrawlFrontierUrl.in_queue.is_(False))
+                .order_by(CrawlFrontierUrl.priority, CrawlFrontierUrl.id)
+                .limit(limit)
+            ).all()
+            if rows:
+                session.execute(
+                    update(CrawlFrontierUrl)
+                    .where(CrawlFrontierUrl.id.in_([row[0] for row in rows]))
+                    .values(in_queue=True)
+                )
+            return [(row[1], row[2]) for row in rows]
+
+    def done(self, url: str) -> None:
+        with get_session() as session:
+            session.execute(delete(CrawlFrontierUrl).where(CrawlFrontierUrl.url == url))
+
+
+# queue item, that stops downloader, goes after all urls
+_STOP = (float("inf"), -1, None)
 
 
 class _Downloader(Thread):
-    downloading: bool = False
     _queue: Queue
     _alive: bool = True
     _crawler: "Crawler"
@@ -68,18 +263,14 @@ class _Downloader(Thread):
         self.counter = 0
 
     def run(self) -> None:
-        # sleep random time, to avoid simultaneous star
-        sleep(random.random() * 3)
         try:
             while self._alive:
                 try:
-                    url = self._queue.get(timeout=1)
-                    with self._loading():
-                        self._process_url(url)
-                    self._queue.task_done()
+                    _, _, url = self._queue.get()
+                    if url is None:
+                        break
+                    self._process_url(url)
                     self.counter += 1
-                except Empty:
-                    pass
                 except Exception as e:
                     self._logger.warning(
                         "Error in thread %s: %s", self.name, e, exc_info=True
@@ -88,27 +279,33 @@ class _Downloader(Thread):
             self._logger.debug("Stopped %s", self.name)
 
     def _process_url(self, url: str):
-        self._logger.debug("Loading %s", url)
+        document = None
+        skipped = False
+        urls = []
         try:
-            document = self._load(url)
-        except Exception as e:
-            self._logger.warning("Error during loading %s: %s", url, e)
-            return
-        self._logger.debug("Extracting %s", url)
-        urls = self._extract(document)
-
-        for next_url in urls:
-            self._crawler.enqueue_url(next_url, source_url=url)
+            self._logger.debug("Loading %s", url)
+            try:
+                document = self._load(url)
+            except SkipUrl as e:
+                self._logger.debug("Skipping %s: %s", url, e)
+                skipped = True
+                return
+            except Exception as e:
+                self._logger.warning("Error during loading %s: %s", url, e)
+                return
+            self._logger.debug("Extracting %s", url)
+            urls = self._extract(document)
+        finally:
+            # children are enqueued before url is done, so outstanding work never drops
+            # to zero while there is more to crawl
+            try:
+                self._crawler.enqueue_urls(urls, source_url=url)
+            finally:
+                self._crawler.url_done(url, document, skipped)
 
     def stop(self):
         self._alive = False
 
-    @contextmanager
-    def _loading(self):
-        self.downloading = True
-        yield
-        self.downloading = False
-
 
 class Crawler:
     _load: Loader
@@ -122,15 +319,42 @@ class Crawler:
         page_processor: Extractor,
         queue_maxsize: int,
         visited_cache_seconds: int,
+        recrawl_min_seconds: int,
+        recrawl_max_seconds: int,
+        fingerprint: Fingerprint | None = None,
+        canonicalize: Canonicalizer | None = None,
+        priority: Priority | None = None,
     ):
+        """
+        :param canonicalize: applied to every url before it is enqueued, returns None for
+            urls, that must be skipped
+        :param priority: order of enqueued urls, lower goes first, equal ones in FIFO order
+        """
         self._load = load
         self._extract = page_processor
+        self._fingerprint = fingerprint
+        self._canonicalize = canonicalize
+        self._priority = priority
         self._logger = logging.getLogger("crawler")
-        self._queue = Queue(maxsize=queue_maxsize)
+        # (priority, sequence number, url)
+        self._queue = PriorityQueue(maxsize=queue_maxsize)
+        self._sequence = itertools.count()
         self._threads = []
         self.__started_at = datetime.datetime.now()
-        self._visited = _DbVisitedSet(cache_seconds=visited_cache_seconds)
+        self._visited = _DbVisitedSet(
+            cache_seconds=visited_cache_seconds,
+            min_interval=recrawl_min_seconds,
+            max_interval=recrawl_max_seconds,
+        )
+        self._frontier = _DbFrontier()
+        # urls, that are waiting in frontier, but not in memory queue
+        self._spilled = self._frontier.resume()
+        # urls, enqueued during this run, to not retry failed ones until the next run
+        self._seen: tp.Set[str] = set()
         self._enqueue_lock = threading.Lock()
+        # enqueued (in memory queue or spilled) and not done urls, join waits for zero
+        self._outstanding = self._spilled
+        self._outstanding_cond = threading.Condition()
 
     def start(self, threads=5):
         self._threads = []
@@ -140,32 +364,153 @@ class Crawler:
             self._threads.append(t)
         self._logger.debug("started with %s downloader threads", threads)
         self.__started_at = datetime.datetime.now()
+        try:
+            self.refill()
+        except BaseException:
+            # downloaders aren't daemons, they would wait on the queue forever
+            self.stop()
+            raise
 
     def add_url(self, url: str):
         self.enqueue_url(url, source_url="seed")
 
+    def add_due_urls(self, accept: tp.Callable[[str], bool] = lambda url: True) -> int:
+        """
+        Enqueues known urls, which recrawl time has come. Needed because unchanged page,
+        that links to them, may be not due itself.
+
+        :return: amount of enqueued urls
+        """
+        return self.enqueue_urls(
+            [url for url in self._visited.due_urls() if accept(url)], source_url="schedule"
+        )
+
     def enqueue_url(self, url: str, source_url: str = "") -> bool:
+        return self.enqueue_urls([url], source_url) > 0
+
+    def enqueue_urls(self, urls: tp.Iterable[str], source_url: str = "") -> int:
+        """
+        Enqueues links of one page. Urls, seen in this run, are dropped before any database
+        query, recrawl schedule and frontier are checked for the rest in one batch, outside
+        of the lock, so downloaders don't wait for each other's queries.
+
+        :return: amount of enqueued urls
+        """
+        source_url = source_url or "unknown"
+        canonical_urls = {}
+        for url in urls:
+            if self._canonicalize:
+                canonical = self._canonicalize(url)
+                if canonical is None:
+                    self._logger.debug("Skipping %s discovered from %s", url, source_url)
+                    continue
+                url = canonical
+            canonical_urls[url] = None
+        with self._enqueue_lock:
+            # claimed by this call, concurrent ones skip them
+            new_urls = [url for url in canonical_urls if url not in self._seen]
+            self._seen.update(new_urls)
+        if not new_urls:
+            return 0
+
+        due = self._visited.due(new_urls)
+        added = self._frontier.add(
+            [(url, self._priority(url) if self._priority else 0.0) for url in due], source_url
+        )
+        if not added:
+            return 0
+
         with self._enqueue_lock:
-            if self._queue.full():
-                self._logger.warning(
-                    "Queue is full (%s). Ignoring page %s discovered from %s",
+            with self._outstanding_cond:
+                self._outstanding += len(added)
+            spilled = []
+            for url, priority in added:
+                if self._queue.full():
+                    spilled.append(url)
+                else:
+                    self._queue.put_nowait((priority, next(self._sequence), url))
+            if spilled:
+                # before counter grows, refill mustn't see fewer unclaimed urls than counted
+                try:
+                    self._frontier.release(spilled)
+                except Exception:
+                    # claimed rows are resumed by the next run, join mustn't wait for them
+                    self._work_done(len(spilled))
+                    raise
+                self._spilled += len(spilled)
+                self._logger.debug(
+                    "Queue is full (%s). %s pages discovered from %s are spilled to frontier",
                     self._queue.maxsize,
-                    url,
-                    source_url or "unknown",
+                    len(spilled),
+                    source_url,
                 )
-                return False
-            if not self._visited.add_if_missing(url):
-                return False
-            self._queue.put_nowait(url)
-            return True
+        return len(added)
+
+    def url_done(self, url: str, document: Document | None, skipped: bool = False) -> None:
+        """
+        Called by downloader after url is processed. Url is marked visited only if it was
+        actually fetched or skipped by loader, failed ones will be tried again in the next run.
+        """
+        try:
+            try:
+                if document is not None:
+                    content_hash = self._fingerprint(document) if self._fingerprint else None
+                    self._visited.mark_visited(url, content_hash)
+                elif skipped:
+                    self._visited.mark_skipped(url)
+            finally:
+                self._frontier.done(url)
+            if self._spilled and self._queue.qsize() <= self._queue.maxsize // 2:
+                self.refill()
+        finally:
+            # join waits for the counter, it must drop even if database fails
+            self._work_done(1)
+
+    def _work_done(self, amount: int) -> None:
+        with self._outstanding_cond:
+            self._outstanding -= amount
+            if self._outstanding <= 0:
+                self._outstanding = 0
+                self._outstanding_cond.notify_all()
+
+    def refill(self) -> None:
+        with self._enqueue_lock:
+            if not self._spilled:
+                return
+            free = self._queue.maxsize - self._queue.qsize() if self._queue.maxsize > 0 else self._spilled
+            if free <= 0:
+                # queue was filled after caller checked it, empty claim doesn't mean lost urls
+                return
+            try:
+                urls = self._frontier.claim(min(free, self._spilled))
+            except Exception:
+                # spilled urls stay in the frontier for the next run, join mustn't wait for them
+                lost, self._spilled = self._spilled, 0
+                self._work_done(lost)
+                raise
+            if not urls:
+                # nothing unclaimed left, counter could drift if frontier was changed outside
+                lost, self._spilled = self._spilled, 0
+                self._work_done(lost)
+                return
+            self._spilled = max(0, self._spilled - len(urls))
+            for url, priority in urls:
+                self._seen.add(url)
+                self._queue.put_nowait((priority, next(self._sequence), url))
 
-    def finished(self):
-        return all((not t.downloading for t in self._threads))
+    def has_pending(self) -> bool:
+        return bool(self._spilled) or not self._queue.empty()
 
     def stop(self):
         self._logger.debug("Stopping all threads")
         for t in self._threads:
             t.stop()
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(_STOP)
+            except Full:
+                # threads will see, that they are stopped, after current urls
+                break
 
     def total_crawled(self) -> int:
         total = 0
@@ -175,11 +520,13 @@ class Crawler:
 
     def join(self) -> int:
         try:
-            while not (self.finished() and self._queue.empty()):
-                sleep(1)
+            with self._outstanding_cond:
+                while self._outstanding > 0:
+                    self._outstanding_cond.wait()
 
             self.stop()
-            # self._queue.join()
+            for t in self._threads:
+                t.join()
             total = datetime.datetime.now() - self.__started_at
             self._logger.info("Crawl finished in %s", total)
             self._logger.info("Crawled %s urls", self.total_crawled())
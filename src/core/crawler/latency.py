@@ -0,0 +1,97 @@
+import threading
+from dataclasses import dataclass, replace
+
+from src.config import CONFIG
+
+
+@dataclass
+class DestinationLatency:
+    link_seconds: float  # EWMA of path discovery + link establishment
+    response_seconds: float  # EWMA of time from established link to response
+    success_rate: float  # EWMA of 1 (response received) / 0 (timeout)
+    samples: int = 0
+
+    @property
+    def expected_seconds(self) -> float:
+        return self.link_seconds + self.response_seconds
+
+
+class LatencyTracker:
+    """
+    Per-destination latency estimates. Used to pick request timeout for each node
+    (fast TCP nodes fail fast, LoRa nodes get enough time) and by crawl scheduler.
+    """
+
+    def __init__(
+            self,
+            default_timeout: float,
+            min_timeout: float,
+            max_timeout: float,
+            timeout_factor: float = 3.0,
+            alpha: float = 0.3,
+    ):
+        self.__lock = threading.Lock()
+        self._default_timeout = float(default_timeout)
+        self._min_timeout = float(min_timeout)
+        self._max_timeout = max(self._min_timeout, float(max_timeout))
+        self._timeout_factor = float(timeout_factor)
+        self._alpha = float(alpha)
+        self._stats: dict[str, DestinationLatency] = {}
+
+    def observe_success(self, address: str, link_seconds: float, response_seconds: float) -> None:
+        self._observe(address, link_seconds, response_seconds, success=True)
+
+    def observe_timeout(
+            self, address: str, elapsed_seconds: float, link_seconds: float | None = None
+    ) -> None:
+        """
+        Timeout over established link only gives lower bound of response time, so it is
+        used as a sample. It pushes estimate up for slow but alive nodes.
+        Without link there is nothing to learn about latency: dead nodes are handled by
+        reachability backoff and must not get longer timeouts.
+        """
+        if link_seconds is None:
+            with self.__lock:
+                stats = self._stats.get(address)
+                if stats is not None:
+                    stats.success_rate = (1 - self._alpha) * stats.success_rate
+            return
+        self._observe(address, link_seconds, elapsed_seconds - link_seconds, success=False)
+
+    def _observe(
+            self, address: str, link_seconds: float, response_seconds: float, success: bool
+    ) -> None:
+        a = self._alpha
+        with self.__lock:
+            stats = self._stats.get(address)
+            if stats is None:
+                self._stats[address] = DestinationLatency(
+                    link_seconds=link_seconds,
+                    response_seconds=response_seconds,
+                    success_rate=1.0 if success else 0.0,
+                    samples=1,
+                )
+                return
+            stats.link_seconds = (1 - a) * stats.link_seconds + a * link_seconds
+            stats.response_seconds = (1 - a) * stats.response_seconds + a * response_seconds
+            stats.success_rate = (1 - a) * stats.success_rate + a * (1.0 if success else 0.0)
+            stats.samples += 1
+
+    def get(self, address: str) -> DestinationLatency | None:
+        with self.__lock:
+            stats = self._stats.get(address)
+            return replace(stats) if stats else None
+
+    def timeout_for(self, address: str) -> float:
+        stats = self.get(address)
+        if stats is None:
+            return self._default_timeout
+        timeout = self._timeout_factor * stats.expected_seconds
+        return min(self._max_timeout, max(self._min_timeout, timeout))
+
+
+latency_tracker = LatencyTracker(
+    default_timeout=CONFIG.CRAWLER_REQUEST_TIMEOUT,
+    min_timeout=CONFIG.CRAWLER_REQUEST_TIMEOUT_MIN,
+    max_timeout=CONFIG.CRAWLER_REQUEST_TIMEOUT_MAX,
+)
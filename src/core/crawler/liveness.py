@@ -0,0 +1,64 @@
+import random
+import threading
+import typing as tp
+
+# p_dead for nodes without survival estimate
+UNKNOWN_P_DEAD = 0.5
+
+
+def plan_seeds(
+        candidates: tp.Iterable[str],
+        p_dead: tp.Mapping[str, float],
+        dead_threshold: float,
+        probe_rate: float,
+        rng: random.Random | None = None,
+) -> tp.Tuple[tp.List[str], int]:
+    """
+    Nodes, that are probably dead (p_dead >= dead_threshold), are seeded only with
+    probe_rate probability, so the model still gets outcomes for them, but most crawls
+    don't spend threads on timeouts. Seeds are ordered from the most alive.
+
+    :return: seeds and amount of skipped nodes
+    """
+    rng = rng or random.Random()
+    seeds, skipped = [], 0
+    for dst in candidates:
+        if p_dead.get(dst, UNKNOWN_P_DEAD) >= dead_threshold and rng.random() >= probe_rate:
+            skipped += 1
+            continue
+        seeds.append(dst)
+    seeds.sort(key=lambda dst: p_dead.get(dst, UNKNOWN_P_DEAD))
+    return seeds, skipped
+
+
+class ProbeLog:
+    """Destinations requested during a crawl run and whether any of requests succeeded."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self._reached: tp.Dict[str, bool] = {}
+
+    def attempted(self, address: str) -> None:
+        with self.__lock:
+            self._reached.setdefault(address, False)
+
+    def reached(self, address: str) -> None:
+        with self.__lock:
+            self._reached[address] = True
+
+    def outcomes(self) -> tp.Dict[str, bool]:
+        with self.__lock:
+            return dict(self._reached)
+
+
+def calibration(samples: tp.Sequence[tp.Tuple[float, bool]]) -> tp.Tuple[float, float, float]:
+    """
+    :param samples: predicted p_dead and whether node was reached
+    :return: mean predicted p_dead, observed unreachable rate and Brier score
+    """
+    if not samples:
+        return 0.0, 0.0, 0.0
+    predicted = sum(p for p, _ in samples) / len(samples)
+    observed = sum(1 for _, reached in samples if not reached) / len(samples)
+    brier = sum((p - (0.0 if reached else 1.0)) ** 2 for p, reached in samples) / len(samples)
+    return predicted, observed, brier
@@ -0,0 +1,60 @@
+import threading
+from dataclasses import dataclass
+
+
+@dataclass
+class InFlightStats:
+    documents: int
+    bytes: int
+    peak_bytes: int
+    largest_bytes: int
+    rejected: int
+
+
+class InFlightMemory:
+    """
+    Bytes of pages, that are downloaded but not processed yet. Shows how much of process
+    memory crawler holds at the moment and at peak.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self._sizes: dict[str, int] = {}
+        self._bytes = 0
+        self._peak_bytes = 0
+        self._largest_bytes = 0
+        self._rejected = 0
+
+    def acquire(self, url: str, size: int) -> None:
+        with self.__lock:
+            self._bytes += size - self._sizes.get(url, 0)
+            self._sizes[url] = size
+            self._peak_bytes = max(self._peak_bytes, self._bytes)
+            self._largest_bytes = max(self._largest_bytes, size)
+
+    def release(self, url: str) -> None:
+        with self.__lock:
+            self._bytes -= self._sizes.pop(url, 0)
+
+    def rejected(self) -> None:
+        """Counts page, that was too large to be downloaded."""
+        with self.__lock:
+            self._rejected += 1
+
+    def stats(self) -> InFlightStats:
+        """Peak, largest and rejected are counted since the previous call."""
+        with self.__lock:
+            stats = InFlightStats(
+                documents=len(self._sizes),
+                bytes=self._bytes,
+                peak_bytes=self._peak_bytes,
+                largest_bytes=self._largest_bytes,
+                rejected=self._rejected,
+            )
+            self._peak_bytes = self._bytes
+            self._largest_bytes = 0
+            self._rejected = 0
+            return stats
+
+
+in_flight_pages = InFlightMemory()
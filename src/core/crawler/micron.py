@@ -0,0 +1,108 @@
+"""
+Micron markup to indexable text and raw link blocks (content of `[...], in
+``parse_link_block`` format).
+
+Text is stripped by sequential regex passes: each of them runs in C, which is faster than
+a python lexer on markup-heavy pages.
+
+Golden check against examples/micron/expected.json and benchmark:
+    python -m src.core.crawler.micron [--update]
+"""
+import re
+import typing as tp
+
+_RE_FB = re.compile(r"`[fb]")
+_RE_FB_CAPS = re.compile(r"`[FB]...")
+_RE_TAGS = re.compile(r"`<[^>]*>")
+_RE_COMMENT = re.compile(r"#.*$", flags=re.MULTILINE)
+_RE_GT_LINE_START = re.compile(r"^\s*>+", flags=re.MULTILINE)
+# only whitespace, that changes on normalization (single spaces are the most of text)
+_RE_SPACES = re.compile(r"\t[ \t]*| [ \t]+")
+_RE_PARAGRAPH = re.compile(r"\n\s*\n+")
+_RE_LINK = re.compile(r"`\[(.*?)]")
+
+# removed as `x
+_MICRON_CHARS = "car!_=`"
+
+
+def strip_micron(text: str) -> str:
+    text = _RE_FB.sub("", text)
+    text = _RE_FB_CAPS.sub("", text)
+
+    for t in _MICRON_CHARS:
+        text = text.replace(f"`{t}", "")
+
+    text = _RE_TAGS.sub(" ", text)
+    text = _RE_COMMENT.sub("", text)
+    text = _RE_GT_LINE_START.sub("", text)
+    text = text.replace("\\", " ")
+    text = _RE_SPACES.sub(" ", text)
+    text = _RE_PARAGRAPH.sub("\n\n", text)
+    text = text.replace("`", "")
+
+    return text
+
+
+def link_blocks(page: str) -> tp.List[str]:
+    """
+    :return: content of `[...] link blocks
+    """
+    return _RE_LINK.findall(page)
+
+
+def parse_micron(page: str) -> tp.Tuple[str, tp.List[str]]:
+    """
+    :return: plain text and link blocks
+    """
+    return strip_micron(page), link_blocks(page)
+
+
+if __name__ == "__main__":
+    import glob
+    import json
+    import os
+    import sys
+    import time
+
+    examples = os.path.join(os.path.dirname(__file__), "../../../examples/micron")
+    expected_path = os.path.join(examples, "expected.json")
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(examples, "*.mu"))):
+        with open(path, "r", encoding="utf-8") as f:
+            pages[os.path.basename(path)] = f.read()
+    parsed = {name: parse_micron(page) for name, page in pages.items()}
+
+    if "--update" in sys.argv[1:]:
+        with open(expected_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {name: {"text": text, "links": links} for name, (text, links) in parsed.items()},
+                f,
+                ensure_ascii=False,
+                indent=1,
+            )
+            f.write("\n")
+        print(f"wrote expected output of {len(parsed)} pages")
+        sys.exit(0)
+
+    with open(expected_path, "r", encoding="utf-8") as f:
+        expected = json.load(f)
+    mismatches = [
+        name
+        for name in sorted(set(expected) | set(parsed))
+        if name not in expected
+        or name not in parsed
+        or parsed[name] != (expected[name]["text"], expected[name]["links"])
+    ]
+    for name in mismatches:
+        print("mismatch:", name)
+    print(f"{len(parsed) - len(mismatches)}/{len(parsed)} pages match expected output")
+
+    total_mb = sum(len(p) for p in pages.values()) / 1e6
+    rounds = max(1, int(50 / max(total_mb, 0.01)))
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages.values():
+            parse_micron(page)
+    elapsed = time.perf_counter() - started
+    print(f"parse_micron: {total_mb * rounds / elapsed:.2f} MB/s")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import typing as tp
+import zlib
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.config import CONFIG
+from src.core.crawler.blobs import blob_path, read_blob
+from src.core.data import get_path
+from src.core.data.db import get_session
+from src.core.data.models import StoredPage
+
+
+class PageStore:
+    """
+    Raw fetched pages, so index can be rebuilt without recrawl. Blobs are zlib-compressed
+    files named by sha1 of page content, urls with the same content share a blob.
+    When blobs take more than max_bytes, pages fetched the longest ago are evicted.
+    """
+
+    EVICT_TO = 0.9
+
+    def __init__(self, root: str, max_bytes: int):
+        self.__lock = threading.Lock()
+        self._logger = logging.getLogger("page-store")
+        self.root = root
+        self._max_bytes = max(0, int(max_bytes))
+        self._total_bytes: int | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_bytes > 0
+
+    def put(self, url: str, owner: str | None, raw: bytes, content_hash: str | None = None) -> None:
+        if not self.enabled:
+            return
+        content_hash = content_hash or hashlib.sha1(raw).hexdigest()
+        with self.__lock:
+            total = self._get_total_bytes_locked()
+            with get_session() as session:
+                old_hash = session.execute(
+                    select(StoredPage.content_hash).where(StoredPage.url == url)
+                ).scalar_one_or_none()
+                size = session.execute(
+                    select(StoredPage.size).where(StoredPage.content_hash == content_hash).limit(1)
+                ).scalar_one_or_none()
+                if size is None:
+                    size = self._write_blob(content_hash, raw)
+                    total += size
+                session.execute(
+                    sqlite_insert(StoredPage)
+                    .values(
+                        url=url,
+                        owner=owner,
+                        content_hash=content_hash,
+                        size=size,
+                        fetched_at=time.time(),
+                    )
+                    .on_conflict_do_update(
+                        index_elements=["url"],
+                        set_={
+                            "owner": owner,
+                            "content_hash": content_hash,
+                            "size": size,
+                            "fetched_at": time.time(),
+                        },
+                    )
+                )
+                if old_hash and old_hash != content_hash:
+                    total -= self._drop_unused_blob(session, old_hash)
+            self._total_bytes = total
+            if total > self._max_bytes:
+                self._evict_locked()
+
+    def get(self, content_hash: str) -> bytes | None:
+        return read_blob(self.root, content_hash)
+
+    def pages(self) -> tp.List[tp.Tuple[str, str | None, str]]:
+        """
+        :return: url, owner, content_hash of all stored pages
+        """
+        with get_session() as session:
+            rows = session.execute(
+                select(StoredPage.url, StoredPage.owner, StoredPage.content_hash)
+            ).all()
+        return [tuple(row) for row in rows]
+
+    def total_bytes(self) -> int:
+        with self.__lock:
+            return self._get_total_bytes_locked()
+
+    def _get_total_bytes_locked(self) -> int:
+        if self._total_bytes is None:
+            with get_session() as session:
+                blobs = (
+                    select(func.max(StoredPage.size).label("size"))
+                    .group_by(StoredPage.content_hash)
+                    .subquery()
+                )
+                self._total_bytes = int(
+                    session.execute(select(func.coalesce(func.sum(blobs.c.size), 0))).scalar_one()
+                )
+        return self._total_bytes
+
+    def _write_blob(self, content_hash: str, raw: bytes) -> int:
+        path = blob_path(self.root, content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = zlib.compress(raw)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def _drop_unused_blob(self, session, content_hash: str) -> int:
+        """
+        :return: freed bytes
+        """
+        used = session.execute(
+            select(StoredPage.id).where(StoredPage.content_hash == content_hash).limit(1)
+        ).first()
+        if used:
+            return 0
+        path = blob_path(self.root, content_hash)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return 0
+        return size
+
+    def _evict_locked(self) -> None:
+        target = int(self._max_bytes * self.EVICT_TO)
+        evicted = 0
+        with get_session() as session:
+            while self._total_bytes > target:
+                rows = session.execute(
+                    select(StoredPage.id, StoredPage.content_hash)
+                    .order_by(StoredPage.fetched_at)
+                    .limit(100)
+                ).all()
+                if not rows:
+                    self._total_bytes = 0
+                    break
+                session.execute(delete(StoredPage).where(StoredPage.id.in_([r[0] for r in rows])))
+                for content_hash in {r[1] for r in rows}:
+                    self._total_bytes -= self._drop_unused_blob(session, content_hash)
+                evicted += len(rows)
+        self._logger.info(
+            "evicted %s pages, store takes %.1f MB", evicted, self._total_bytes / (1024 * 1024)
+        )
+
+
+page_store = PageStore(get_path("pages"), CONFIG.CRAWLER_PAGE_STORE_MAX_BYTES)
@@ -1,14 +1,23 @@
 import logging
-import re
 import typing as tp
 
-_link_re = re.compile(r"`\[(.*?)]")
+from src.core.crawler.micron import link_blocks, parse_micron
+
+# plain text, internal links, external links
+ParsedPage = tp.Tuple[str, tp.List[str], tp.List[str]]
 
 
 def extract_links(address: str, page: str) -> tp.Tuple[tp.List[str], tp.List[str]]:
-    links = _link_re.findall(page)
+    return classify_links(address, link_blocks(page))
+
+
+def classify_links(address: str, blocks: tp.Iterable[str]) -> tp.Tuple[tp.List[str], tp.List[str]]:
+    """
+    :param blocks: content of `[...] link blocks
+    :return: internal and external links
+    """
     internal, external = set(), set()
-    for link in links:
+    for link in blocks:
         link = parse_link_block(link)
         if ":" not in link:
             continue
@@ -19,6 +28,26 @@ def extract_links(address: str, page: str) -> tp.Tuple[tp.List[str], tp.List[str
     return list(internal), list(external)
 
 
+def parse_page(address: str, raw: bytes, max_text_chars: int = 0) -> ParsedPage | None:
+    """
+    Decodes and parses page. Depends only on its arguments, so it can run in a worker process.
+
+    :param max_text_chars: plain text is truncated to this length, 0 - unlimited
+    :return: None, if page is empty or isn't utf-8
+    """
+    try:
+        page = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    if not page:
+        return None
+    text, blocks = parse_micron(page)
+    if max_text_chars and len(text) > max_text_chars:
+        text = text[:max_text_chars]
+    internal, external = classify_links(address, blocks)
+    return text, internal, external
+
+
 def parse_link_block(link: str):
     seps = link.count("`")
     if seps == 0:
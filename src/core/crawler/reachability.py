@@ -0,0 +1,56 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from src.config import CONFIG
+
+
+@dataclass
+class _DestinationState:
+    failures: int = 0
+    unreachable_until: float = 0.0
+
+
+class ReachabilityCache:
+    """
+    Negative cache for destinations, that failed path discovery or link establishment.
+    While destination is in backoff, requests to it are rejected without network attempt,
+    so the rest of dead node's queued pages don't wait for timeout one by one.
+    """
+
+    def __init__(self, base_backoff_seconds: float, max_backoff_seconds: float):
+        self.__lock = threading.Lock()
+        self._logger = logging.getLogger("crawler-reachability")
+        self._base_backoff = max(1.0, float(base_backoff_seconds))
+        self._max_backoff = max(self._base_backoff, float(max_backoff_seconds))
+        self._states: dict[str, _DestinationState] = {}
+
+    def is_unreachable(self, address: str) -> bool:
+        with self.__lock:
+            state = self._states.get(address)
+            return state is not None and state.unreachable_until > time.time()
+
+    def mark_failed(self, address: str) -> float:
+        """
+        :return: backoff in seconds, during which destination is considered unreachable
+        """
+        with self.__lock:
+            state = self._states.setdefault(address, _DestinationState())
+            state.failures += 1
+            backoff = min(self._max_backoff, self._base_backoff * 2 ** (state.failures - 1))
+            state.unreachable_until = time.time() + backoff
+        self._logger.debug(
+            "%s is unreachable (%s failures in a row), backoff %.0fs", address, state.failures, backoff
+        )
+        return backoff
+
+    def mark_reachable(self, address: str) -> None:
+        with self.__lock:
+            self._states.pop(address, None)
+
+
+reachability = ReachabilityCache(
+    base_backoff_seconds=CONFIG.CRAWLER_UNREACHABLE_BACKOFF_SECONDS,
+    max_backoff_seconds=CONFIG.CRAWLER_UNREACHABLE_MAX_BACKOFF_SECONDS,
+)
@@ -0,0 +1,117 @@
+"""
+Rebuilds search index and citations from page store, without recrawl. Needed after
+changes of Micron parsing, analyzers or index schema.
+Stop the service before running: index writer is exclusive.
+
+Run from project root with env set:
+    python -m src.core.crawler.reindex [--processes N] [--clear]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor
+
+from src.core.crawler.blobs import read_blob
+from src.core.crawler.parser import ParsedPage, parse_page
+
+_BATCH_SIZE = 200
+
+
+def _parse_stored(
+        root: str, url: str, content_hash: str, max_text_chars: int
+) -> tp.Tuple[str, ParsedPage | None]:
+    raw = read_blob(root, content_hash)
+    if raw is None:
+        return url, None
+    return url, parse_page(url.partition(":")[0], raw, max_text_chars)
+
+
+def reindex(processes: int, clear: bool) -> tp.Tuple[int, int]:
+    """
+    :return: amount of indexed and skipped pages
+    """
+    # not at module level: spawned workers import this module, importing config there would
+    # add log handlers and database engines in every worker
+    from src.config import CONFIG
+    from src.core.crawler.page_store import page_store
+    from src.core.crawler.urls import canonicalizer
+    from src.core.data.citations import CitationBatch, citations
+    from src.core.data.nods_and_peers import find_node_by_address
+    from src.core.search import SearchDocument
+    from src.core.search import engine as search_engine
+
+    pages = page_store.pages()
+    owners = {url: owner for url, owner, _ in pages}
+    if clear:
+        search_engine.clear()
+
+    names: tp.Dict[str, str | None] = {}
+    citation_batch = CitationBatch()
+    batch: tp.List[SearchDocument] = []
+    indexed = skipped = 0
+    with ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        results = pool.map(
+            _parse_stored,
+            [page_store.root] * len(pages),
+            [url for url, _, _ in pages],
+            [content_hash for _, _, content_hash in pages],
+            [CONFIG.CRAWLER_MAX_TEXT_CHARS] * len(pages),
+            chunksize=16,
+        )
+        for url, parsed in results:
+            if parsed is None:
+                skipped += 1
+                continue
+            text, _, external_links = parsed
+            address = url.partition(":")[0]
+            if address not in names:
+                node = find_node_by_address(address)
+                names[address] = node.get("name") if node else None
+            batch.append(
+                SearchDocument(
+                    url=url,
+                    text=text,
+                    owner=owners[url],
+                    address=address,
+                    nodeName=names[address],
+                )
+            )
+            citation_batch.add(
+                url, [canonicalizer.canonicalize(link) or link for link in external_links]
+            )
+            indexed += 1
+            if len(batch) >= _BATCH_SIZE:
+                search_engine.index_documents(batch)
+                batch = []
+    if batch:
+        search_engine.index_documents(batch)
+    citation_batch.apply(citations.update_pages)
+    return indexed, skipped
+
+
+def main():
+    from src.core.data.db import init_db
+
+    arg_parser = argparse.ArgumentParser(description="Rebuild search index from page store")
+    arg_parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    arg_parser.add_argument(
+        "--clear", action="store_true", help="recreate index, pages missing in store are lost"
+    )
+    args = arg_parser.parse_args()
+
+    init_db()
+    started_at = time.perf_counter()
+    indexed, skipped = reindex(max(1, args.processes), args.clear)
+    elapsed = time.perf_counter() - started_at
+    print(
+        f"indexed {indexed} pages ({skipped} unreadable) in {elapsed:.1f}s, "
+        f"{indexed / max(elapsed, 1e-9):.1f} pages/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
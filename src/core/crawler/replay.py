@@ -0,0 +1,198 @@
+"""
+Crawl archive: responses recorded during real crawls (CRAWLER_RECORD_PATH), that can be
+served again without RNS to measure crawler pipeline offline.
+
+Archive is gzipped JSON lines, every crawl run appends a gzip member.
+
+Benchmark (use scratch STORAGE_PATH, replayed crawl writes visited urls and search index):
+    python -m src.core.crawler.replay archive.jsonl.gz [--threads 5] [--latency-scale 1.0]
+"""
+import base64
+import gzip
+import json
+import logging
+import threading
+import time
+import typing as tp
+from dataclasses import dataclass
+
+OUTCOME_OK = "ok"
+# loader returned nothing: timeout, unreachable destination, url without page
+OUTCOME_NONE = "none"
+# loader raised SkipUrl: url is marked skipped instead of visited
+OUTCOME_SKIPPED = "skipped"
+OUTCOME_ERROR = "error"
+
+
+@dataclass
+class ArchiveEntry:
+    url: str
+    latency: float
+    outcome: str
+    response: bytes | None = None
+    owner: str | None = None
+
+
+class ArchiveRecorder:
+    def __init__(self, path: str):
+        self.__lock = threading.Lock()
+        self._logger = logging.getLogger("crawler-archive")
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self.recorded = 0
+
+    def record(self, entry: ArchiveEntry) -> None:
+        line = json.dumps(
+            {
+                "url": entry.url,
+                "latency": round(entry.latency, 4),
+                "outcome": entry.outcome,
+                "response": (
+                    base64.b64encode(entry.response).decode("ascii")
+                    if entry.response is not None else None
+                ),
+                "owner": entry.owner,
+            }
+        )
+        with self.__lock:
+            self._file.write(line + "\n")
+            self.recorded += 1
+
+    def close(self) -> None:
+        with self.__lock:
+            self._file.close()
+        self._logger.info("recorded %s responses", self.recorded)
+
+
+def read_archive(path: str) -> tp.Dict[str, ArchiveEntry]:
+    """
+    :return: url -> the last recorded entry
+    """
+    entries = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            response = row.get("response")
+            entries[row["url"]] = ArchiveEntry(
+                url=row["url"],
+                latency=float(row["latency"]),
+                outcome=row["outcome"],
+                response=base64.b64decode(response) if response is not None else None,
+                owner=row.get("owner"),
+            )
+    return entries
+
+
+class _ReplayIdentity:
+    def __init__(self, hexhash: str | None):
+        self.hexhash = hexhash
+
+
+class _ReplayLink:
+    def __init__(self, owner: str | None):
+        self._identity = _ReplayIdentity(owner)
+
+    def get_remote_identity(self) -> _ReplayIdentity:
+        return self._identity
+
+
+class ReplayReceipt:
+    """Stands for RNS.RequestReceipt: only response and link are used by crawler."""
+
+    def __init__(self, entry: ArchiveEntry):
+        self.response = entry.response
+        self.link = _ReplayLink(entry.owner)
+
+
+def replay(entry: ArchiveEntry | None, latency_scale: float) -> ReplayReceipt | None:
+    """
+    Waits recorded latency and returns recorded response.
+
+    :raise RuntimeError: if loader failed, when entry was recorded
+    """
+    if entry is None:
+        return None
+    if latency_scale > 0:
+        time.sleep(entry.latency * latency_scale)
+    if entry.outcome == OUTCOME_ERROR:
+        raise RuntimeError(f"recorded error for {entry.url}")
+    if entry.outcome != OUTCOME_OK:
+        return None
+    return ReplayReceipt(entry)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sqlalchemy import func, select
+
+    from src.core.crawl import extract, replay_loader
+    from src.core.crawler.crawler import Crawler
+    from src.core.crawler.telemetry import STAGE_INDEX, CrawlTelemetry
+    from src.core.crawler.urls import canonicalizer
+    from src.core.data.db import get_session, init_db
+    from src.core.data.models import CrawlFrontierUrl, CrawlVisitedUrl
+    from src.core.search import engine as search_engine
+
+    arg_parser = argparse.ArgumentParser(description="Replay recorded crawl and measure it")
+    arg_parser.add_argument("archive")
+    arg_parser.add_argument("--threads", type=int, default=5)
+    arg_parser.add_argument(
+        "--latency-scale", type=float, default=1.0, help="0 replays without waiting"
+    )
+    args = arg_parser.parse_args()
+
+    init_db()
+    with get_session() as session:
+        used = session.execute(select(func.count(CrawlVisitedUrl.id))).scalar_one() + \
+            session.execute(select(func.count(CrawlFrontierUrl.id))).scalar_one()
+    if used:
+        raise SystemExit("crawl tables aren't empty, run benchmark with scratch STORAGE_PATH")
+
+    archive = read_archive(args.archive)
+    seeds = [url for url in archive if url.endswith(":/page/index.mu")]
+    load_recorded = replay_loader(archive, args.latency_scale)
+    served = []
+
+    def load_and_count(url: str):
+        doc = load_recorded(url)
+        if doc is not None:
+            served.append(url)
+        return doc
+
+    telemetry = CrawlTelemetry()
+    crawler = Crawler(
+        load_and_count,
+        lambda doc: extract(doc, telemetry=telemetry),
+        queue_maxsize=5000,
+        visited_cache_seconds=24 * 60 * 60,
+        recrawl_min_seconds=60 * 60,
+        recrawl_max_seconds=14 * 24 * 60 * 60,
+        canonicalize=canonicalizer.canonicalize,
+    )
+    for url in seeds:
+        crawler.add_url(url)
+
+    started_at, cpu_started_at = time.perf_counter(), time.process_time()
+    crawler.start(args.threads)
+    processed = crawler.join()
+    with telemetry.measure(STAGE_INDEX):
+        search_engine.flush_index_queue()
+    elapsed = time.perf_counter() - started_at
+    cpu = time.process_time() - cpu_started_at
+    pages = len(served)
+
+    print(f"archive: {len(archive)} urls, {len(seeds)} seeds")
+    print(f"urls: {processed} processed, {processed - pages} not recorded or failed")
+    print(f"pages: {pages} in {elapsed:.2f}s, {pages / max(elapsed, 1e-9):.1f} pages/s")
+    print(f"cpu: {cpu:.2f}s, {cpu / max(pages, 1) * 1000:.2f} ms/page")
+    print(
+        f"index: {search_engine.commits} commits, {search_engine.commit_seconds:.2f}s, "
+        f"{search_engine.commit_seconds / max(search_engine.commits, 1) * 1000:.1f} ms/commit"
+    )
+    for stage, histogram in sorted(telemetry.stages().items(), key=lambda i: -i[1].total):
+        print(
+            f"  {stage:<9} {histogram.count:>6} calls, total {histogram.total:.2f}s, "
+            f"p95 <= {histogram.quantile(0.95):.3f}s"
+        )
@@ -1,5 +1,6 @@
 import asyncio
 import re
+import time
 from asyncio.futures import Future
 import logging
 from dataclasses import dataclass
@@ -10,21 +11,31 @@ from async_timeout import timeout as atimeout
 import RNS
 import typing as tp
 
+from src.core.crawler.latency import latency_tracker
+from src.core.crawler.reachability import reachability
+
 APP_NAME = "nomadnetwork"
 
 
 class _AsyncWrapper:
     def __init__(self):
         self.res = None
+        self.error: Exception | None = None
         self._completed = False
 
     def on_success(self, res):
         self._completed = True
         self.res = res
 
+    def on_error(self, error: Exception):
+        self._completed = True
+        self.error = error
+
     async def get(self):
         while not self._completed:
             await asyncio.sleep(0.1)
+        if self.error:
+            raise self.error
         return self.res
 
 
@@ -39,35 +50,120 @@ class RequestError(Exception):
         return self.res
 
 
+class DestinationUnreachable(Exception):
+    pass
+
+
+class ResponseTooLarge(Exception):
+    def __init__(self, size: int, *args: object) -> None:
+        super().__init__(size, *args)
+        self.size = size
+
+
+@dataclass
+class RequestTrace:
+    """Timestamps of request stages, unset ones weren't reached."""
+
+    started_at: float = 0.0
+    path_found_at: float | None = None
+    link_established_at: float | None = None
+    finished_at: float | None = None
+
+
 async def establish_link(dst: RNS.Destination):
     link = _AsyncWrapper()
     RNS.Link(dst, established_callback=link.on_success)
     return await link.get()
 
 
-async def async_request(url: str, data: dict | None = None) -> RNS.RequestReceipt:
+async def async_request(
+    url: str,
+    data: dict | None = None,
+    trace: RequestTrace | None = None,
+    max_size: int | None = None,
+) -> RNS.RequestReceipt:
+    """
+    :param max_size: bigger responses are cancelled as soon as their size is advertised
+    """
     server, path = await parse_url(url)
+    if trace:
+        trace.path_found_at = time.time()
     link = await establish_link(server)
+    if trace:
+        trace.link_established_at = time.time()
     res = _AsyncWrapper()
 
     def fail(_res):
         raise RequestError(_res, "Request failed")
 
+    def check_size(receipt: RNS.RequestReceipt):
+        # response_size comes with resource advertisement, before the transfer
+        if max_size and receipt.response_size and receipt.response_size > max_size:
+            # failed receipt cancels response resource on the next progress
+            receipt.status = RNS.RequestReceipt.FAILED
+            res.on_error(ResponseTooLarge(receipt.response_size))
+
     link.request(
         path=path,
         data=data,
-        # progress_callback=lambda r: logger.debug("in progress: %s", r),
+        progress_callback=check_size,
         response_callback=res.on_success,
         failed_callback=fail,
     )
-    return await res.get()
+    receipt = await res.get()
+    # single packet responses have no progress
+    if max_size and isinstance(receipt.response, bytes) and len(receipt.response) > max_size:
+        raise ResponseTooLarge(len(receipt.response))
+    return receipt
 
 
 def request(
-    url: str, data: dict | None = None, timeout: int = 20
+    url: str,
+    data: dict | None = None,
+    timeout: float | None = None,
+    max_size: int | None = None,
+    trace: RequestTrace | None = None,
 ) -> RNS.RequestReceipt:
+    """
+    :param timeout: if None, timeout is picked from destination's observed latency
+    :param trace: filled with timestamps of request stages
+    :raise ResponseTooLarge: if response is bigger than max_size
+    """
+    address = address_from_url(url)
+    if reachability.is_unreachable(address):
+        raise DestinationUnreachable(address)
+    if timeout is None:
+        timeout = latency_tracker.timeout_for(address)
+    trace = trace or RequestTrace()
+    trace.started_at = time.time()
     loop = asyncio.new_event_loop()
-    return loop.run_until_complete(asyncio.wait_for(async_request(url, data), timeout))
+    try:
+        res = loop.run_until_complete(
+            asyncio.wait_for(async_request(url, data, trace, max_size), timeout)
+        )
+    except asyncio.TimeoutError:
+        elapsed = time.time() - trace.started_at
+        # slow transfer over established link doesn't mean, that node is gone
+        if trace.link_established_at is None:
+            reachability.mark_failed(address)
+            latency_tracker.observe_timeout(address, elapsed)
+        else:
+            reachability.mark_reachable(address)
+            latency_tracker.observe_timeout(
+                address, elapsed, trace.link_established_at - trace.started_at
+            )
+        raise
+    except ResponseTooLarge:
+        reachability.mark_reachable(address)
+        raise
+    trace.finished_at = time.time()
+    reachability.mark_reachable(address)
+    latency_tracker.observe_success(
+        address,
+        link_seconds=trace.link_established_at - trace.started_at,
+        response_seconds=trace.finished_at - trace.link_established_at,
+    )
+    return res
 
 
 def address_from_url(url: str):
@@ -0,0 +1,132 @@
+import bisect
+import json
+import logging
+import threading
+import time
+import typing as tp
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from src.core.data.db import get_session
+from src.core.data.models import CrawlStageStats
+
+# waiting for concurrency slot and bandwidth
+STAGE_WAIT = "wait"
+STAGE_PATH = "path"
+STAGE_LINK = "link"
+# from established link to response
+STAGE_REQUEST = "request"
+# decode + Micron stripping + link extraction, they are done in one pass
+STAGE_PARSE = "parse"
+STAGE_STORE = "store"
+# includes index commit, when batch is full
+STAGE_INDEX = "index"
+STAGE_CITATIONS = "citations"
+
+# upper bounds of histogram buckets, seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+
+
+@dataclass
+class StageHistogram:
+    # the last bucket is for values above BUCKETS[-1]
+    counts: tp.List[int] = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+    total: float = 0.0
+    max: float = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def add(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of bucket, where quantile falls."""
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return 0.0
+
+
+class CrawlTelemetry:
+    """Per-stage timings of one crawl run, aggregated into histograms and per-node totals."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self._logger = logging.getLogger("crawler-telemetry")
+        self.started_at = time.time()
+        self._stages: tp.Dict[str, StageHistogram] = {}
+        self._node_seconds: tp.Dict[str, float] = {}
+
+    def observe(self, stage: str, seconds: float, address: str | None = None) -> None:
+        """
+        :param address: node, which the time is spent on, None for work of the whole run
+        """
+        seconds = max(0.0, seconds)
+        with self.__lock:
+            self._stages.setdefault(stage, StageHistogram()).add(seconds)
+            if address is not None:
+                self._node_seconds[address] = self._node_seconds.get(address, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage: str, address: str | None = None):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started_at, address)
+
+    def stages(self) -> tp.Dict[str, StageHistogram]:
+        with self.__lock:
+            return {
+                stage: StageHistogram(list(h.counts), h.total, h.max)
+                for stage, h in self._stages.items()
+            }
+
+    def slowest_nodes(self, limit: int = 5) -> tp.List[tp.Tuple[str, float]]:
+        with self.__lock:
+            return sorted(self._node_seconds.items(), key=lambda i: -i[1])[:limit]
+
+    def save(self) -> None:
+        stages = self.stages()
+        if not stages:
+            return
+        with get_session() as session:
+            for stage, histogram in stages.items():
+                session.add(
+                    CrawlStageStats(
+                        crawl_started_at=self.started_at,
+                        stage=stage,
+                        count=histogram.count,
+                        total_seconds=histogram.total,
+                        max_seconds=histogram.max,
+                        p50_seconds=histogram.quantile(0.5),
+                        p95_seconds=histogram.quantile(0.95),
+                        buckets=json.dumps(histogram.counts),
+                    )
+                )
+
+    def log_summary(self) -> None:
+        stages = self.stages()
+        if not stages:
+            return
+        for stage, h in sorted(stages.items(), key=lambda i: -i[1].total):
+            self._logger.info(
+                "%-9s %6s calls, total %8.1fs, p50 <= %.3fs, p95 <= %.3fs, max %.3fs",
+                stage,
+                h.count,
+                h.total,
+                h.quantile(0.5),
+                h.quantile(0.95),
+                h.max,
+            )
+        self._logger.info(
+            "slowest nodes: %s",
+            ", ".join(f"{address} ({seconds:.1f}s)" for address, seconds in self.slowest_nodes()),
+        )
@@ -0,0 +1,79 @@
+import logging
+import posixpath
+import re
+import typing as tp
+
+from src.config import CONFIG
+
+_ADDRESS_RE = re.compile(r"[0-9a-f]{32}")
+# leftovers of surrounding text and markup, that get into link blocks
+_TRAILING_JUNK = " \t\r\n`.,;:!?)]}'\"|"
+_PAGE_PREFIX = "/page/"
+_PAGE_SUFFIX = ".mu"
+
+
+class UrlCanonicalizer:
+    """
+    Brings crawled urls (``address:/page/path.mu`field=value|...``) to one form, so link
+    variants of the same page are fetched, indexed and cited once.
+
+    Address is lowercased, path is normalized, volatile fields are removed and the rest
+    are sorted. Urls, that don't lead to a Micron page or are too long, are rejected.
+    """
+
+    def __init__(self, volatile_params: tp.Iterable[str], max_length: int):
+        self._logger = logging.getLogger("crawler-urls")
+        params = {p.strip() for p in volatile_params if p.strip()}
+        # "*" drops all fields
+        self._drop_all_params = "*" in params
+        self._volatile_params = frozenset(params - {"*"})
+        self._max_length = int(max_length)
+
+    def canonicalize(self, url: str) -> str | None:
+        """
+        :return: canonical url or None, if url must not be crawled
+        """
+        address, sep, path = url.strip().partition(":")
+        if not sep:
+            return None
+        address = address.strip().lower()
+        if not _ADDRESS_RE.fullmatch(address):
+            return None
+
+        path, _, params = path.partition("`")
+        # only path: field values may end with the same characters, e.g. "`q=what?"
+        path = path.strip().rstrip(_TRAILING_JUNK)
+        if not path.startswith("/"):
+            return None
+        path = posixpath.normpath(path)
+        # normpath keeps leading "//"
+        path = "/" + path.lstrip("/")
+        if not path.startswith(_PAGE_PREFIX) or not path.endswith(_PAGE_SUFFIX):
+            return None
+
+        canonical = address + ":" + path
+        params = self._canonical_params(params)
+        if params:
+            canonical += "`" + params
+        if len(canonical) > self._max_length:
+            self._logger.debug("url is too long (%s): %s...", len(canonical), canonical[:64])
+            return None
+        return canonical
+
+    def _canonical_params(self, params: str) -> str:
+        if self._drop_all_params or not params:
+            return ""
+        kept = set()
+        for param in params.split("|"):
+            param = param.strip()
+            name = param.split("=", 1)[0]
+            if not name or name in self._volatile_params:
+                continue
+            kept.add(param)
+        return "|".join(sorted(kept))
+
+
+canonicalizer = UrlCanonicalizer(
+    volatile_params=CONFIG.CRAWLER_URL_VOLATILE_PARAMS.split(","),
+    max_length=CONFIG.CRAWLER_MAX_URL_LENGTH,
+)
@@ -0,0 +1,115 @@
+import time
+import typing as tp
+from dataclasses import dataclass
+
+from src.config import CONFIG
+from src.core.data.nods_and_peers import Announce, upsert_nodes, upsert_peers
+from src.core.data.write_behind import WriteBehindBuffer
+
+KIND_NODE = "node"
+KIND_PEER = "peer"
+
+
+@dataclass
+class AnnounceBufferStats:
+    depth: int
+    peak_depth: int
+    received: int
+    # announces replaced by a newer one of the same destination before flush
+    coalesced: int
+    flushes: int
+    flushed: int
+    failed: int
+    last_flush_seconds: float
+    max_flush_seconds: float
+
+
+class AnnounceBuffer(WriteBehindBuffer):
+    """
+    Announces, waiting to be written. Only the latest announce of a destination is kept,
+    so RNS transport thread doesn't wait for database commits.
+    """
+
+    def __init__(self, flush_interval_seconds: float, max_entries: int):
+        super().__init__("announce-buffer", flush_interval_seconds, max_entries)
+        self._pending: tp.Dict[tp.Tuple[str, str], Announce] = {}
+        self._peak_depth = 0
+        self._received = 0
+        self._coalesced = 0
+        self._flushes = 0
+        self._flushed = 0
+        self._failed = 0
+        self._last_flush_seconds = 0.0
+        self._max_flush_seconds = 0.0
+
+    def add(self, kind: str, dst: str, identity: str, name: str, ts: float) -> None:
+        with self._cond:
+            self._received += 1
+            previous = self._pending.get((kind, dst))
+            if previous is not None:
+                self._coalesced += 1
+                if previous[3] > ts:
+                    return
+            self._pending[(kind, dst)] = (dst, identity, name, ts)
+            self._peak_depth = max(self._peak_depth, len(self._pending))
+            self._added_locked()
+
+    def _depth_locked(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        Writes buffered announces.
+
+        :return: amount of written announces
+        """
+        with self._flush_lock:
+            with self._cond:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            nodes = [a for (kind, _), a in pending.items() if kind == KIND_NODE]
+            peers = [a for (kind, _), a in pending.items() if kind == KIND_PEER]
+            started_at = time.perf_counter()
+            try:
+                upsert_nodes(nodes)
+                upsert_peers(peers)
+            except Exception as e:
+                self._logger.warning("Error during flush of %s announces: %s", len(pending), e)
+                with self._cond:
+                    self._failed += len(pending)
+                    self._failed_locked()
+                    # announces, received meanwhile, are newer
+                    for key, announce in pending.items():
+                        self._pending.setdefault(key, announce)
+                return 0
+            elapsed = time.perf_counter() - started_at
+            with self._cond:
+                self._flushes += 1
+                self._flushed += len(pending)
+                self._last_flush_seconds = elapsed
+                self._max_flush_seconds = max(self._max_flush_seconds, elapsed)
+            return len(pending)
+
+    def stats(self) -> AnnounceBufferStats:
+        """Peak depth and max flush time are counted since the previous call."""
+        with self._cond:
+            stats = AnnounceBufferStats(
+                depth=len(self._pending),
+                peak_depth=self._peak_depth,
+                received=self._received,
+                coalesced=self._coalesced,
+                flushes=self._flushes,
+                flushed=self._flushed,
+                failed=self._failed,
+                last_flush_seconds=self._last_flush_seconds,
+                max_flush_seconds=self._max_flush_seconds,
+            )
+            self._peak_depth = len(self._pending)
+            self._max_flush_seconds = 0.0
+            return stats
+
+
+announce_buffer = AnnounceBuffer(
+    CONFIG.ANNOUNCE_FLUSH_INTERVAL_MS / 1000, CONFIG.ANNOUNCE_FLUSH_MAX_ENTRIES
+)
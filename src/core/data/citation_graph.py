@@ -0,0 +1,107 @@
+import threading
+import typing as tp
+from array import array
+
+from sqlalchemy import select
+
+from src.core.data.db import get_read_session
+from src.core.data.models import Citation
+
+
+class CitationGraph:
+    """
+    Not removed citations between nodes in memory, so pages show citation counts without
+    queries. Addresses are mapped to integer ids, edges of a node are arrays of ids.
+    Loaded from database on first use and updated by Citations after every write.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self._loaded = False
+        self._ids: tp.Dict[str, int] = {}
+        self._addresses: tp.List[str] = []
+        # node id -> ids of nodes, which it cites / which cite it
+        self._cites: tp.List[array] = []
+        self._cited_by: tp.List[array] = []
+
+    def _id_locked(self, address: str) -> int:
+        node_id = self._ids.get(address)
+        if node_id is None:
+            node_id = self._ids[address] = len(self._addresses)
+            self._addresses.append(address)
+            self._cites.append(array("I"))
+            self._cited_by.append(array("I"))
+        return node_id
+
+    def _ensure_loaded_locked(self) -> None:
+        if self._loaded:
+            return
+        with get_read_session() as session:
+            rows = session.execute(
+                select(Citation.src_address, Citation.target_address).where(
+                    Citation.removed.is_(False)
+                )
+            ).all()
+        for src, target in rows:
+            src_id, target_id = self._id_locked(src), self._id_locked(target)
+            self._cites[src_id].append(target_id)
+            self._cited_by[target_id].append(src_id)
+        self._loaded = True
+
+    def replace(self, src: str, targets: tp.Iterable[str]) -> None:
+        """Sets nodes, which src cites. Called after the change is committed."""
+        with self.__lock:
+            if not self._loaded:
+                # will be read from database with the change
+                return
+            src_id = self._id_locked(src)
+            new = {self._id_locked(target) for target in targets}
+            old = set(self._cites[src_id])
+            for target_id in old - new:
+                self._cited_by[target_id].remove(src_id)
+            for target_id in new - old:
+                self._cited_by[target_id].append(src_id)
+            self._cites[src_id] = array("I", sorted(new))
+
+    def remove_nodes(self, addresses: tp.Iterable[str]) -> None:
+        """Drops citations from and to addresses."""
+        with self.__lock:
+            if not self._loaded:
+                return
+            for address in addresses:
+                node_id = self._ids.get(address)
+                if node_id is None:
+                    continue
+                for target_id in self._cites[node_id]:
+                    self._cited_by[target_id].remove(node_id)
+                for src_id in self._cited_by[node_id]:
+                    self._cites[src_id].remove(node_id)
+                self._cites[node_id] = array("I")
+                self._cited_by[node_id] = array("I")
+
+    def in_degree(self, address: str) -> int:
+        with self.__lock:
+            self._ensure_loaded_locked()
+            node_id = self._ids.get(address)
+            return len(self._cited_by[node_id]) if node_id is not None else 0
+
+    def cited_by(self, address: str) -> tp.Set[str]:
+        with self.__lock:
+            self._ensure_loaded_locked()
+            node_id = self._ids.get(address)
+            if node_id is None:
+                return set()
+            return {self._addresses[src_id] for src_id in self._cited_by[node_id]}
+
+    def edges(self) -> tp.List[tp.Tuple[str, str]]:
+        """
+        :return: (src, target) of all citations
+        """
+        with self.__lock:
+            self._ensure_loaded_locked()
+            addresses = self._addresses
+            return [
+                (addresses[src_id], addresses[target_id])
+                for src_id, targets in enumerate(self._cites)
+                for target_id in targets
+            ]
@@ -1,11 +1,14 @@
+import threading
 import time
-from typing import List
+from typing import Callable, Dict, Iterable, List, Set, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import delete, select, text
 
+from src.config import CONFIG
 from src.core.crawler.rns_request import address_from_url
+from src.core.data.citation_graph import CitationGraph
 from src.core.data.db import get_session
-from src.core.data.models import Citation
+from src.core.data.models import CitationPage
 
 
 def _now() -> float:
@@ -13,56 +16,136 @@ def _now() -> float:
 
 
 class Citations:
+    def __init__(self, page_max_age_seconds: float):
+        """
+        :param page_max_age_seconds: links of pages, which weren't crawled for so long, are
+            dropped, such pages are probably gone
+        """
+        self._graph = CitationGraph()
+        self._page_max_age = page_max_age_seconds
+
     def update_citations(self, src: str, links_to: List[str]) -> None:
-        src_address = address_from_url(src)
-        addresses_to = set()
-        for link in links_to:
-            target_address = address_from_url(link)
-            if target_address == src_address:
-                continue
-            if len(target_address) != 32:
-                continue
-            addresses_to.add(target_address)
+        """Replaces links of page src."""
+        self.update_pages({src: links_to})
+
+    def update_pages(self, pages: Dict[str, Iterable[str]]) -> None:
+        """
+        Replaces links of crawled pages. Citations of a node are links of all its known
+        pages, so pages, which weren't crawled this time, keep their citations.
+        """
+        nodes: Dict[str, Dict[str, Set[str]]] = {}
+        for url, links_to in pages.items():
+            src_address = address_from_url(url)
+            targets = nodes.setdefault(src_address, {}).setdefault(url, set())
+            for link in links_to:
+                target_address = address_from_url(link)
+                if target_address == src_address:
+                    continue
+                if len(target_address) != 32:
+                    continue
+                targets.add(target_address)
+        for src_address, node_pages in nodes.items():
+            self._update_node(src_address, node_pages)
+
+    def _update_node(self, src_address: str, pages: Dict[str, Set[str]]) -> None:
         now_ = _now()
 
         with get_session() as session:
-            existing_rows = session.execute(
-                select(Citation).where(Citation.src_address == src_address)
-            ).scalars().all()
-            existing_by_target = {row.target_address: row for row in existing_rows}
-
-            for target_address, row in existing_by_target.items():
-                if target_address in addresses_to:
-                    if row.removed:
-                        row.removed = False
-                else:
-                    if not row.removed:
-                        row.removed = True
-
-            for target_address in addresses_to:
-                if target_address in existing_by_target:
-                    continue
-                session.add(
-                    Citation(
-                        target_address=target_address,
-                        src_address=src_address,
-                        created_at=now_,
-                        removed=False,
-                    )
+            # the row keyed by node address is a backfill of citations, which pages are unknown
+            session.execute(
+                delete(CitationPage).where(
+                    CitationPage.url.in_([src_address, *pages]),
+                    CitationPage.src_address == src_address,
+                )
+            )
+            rows = [
+                {"url": url, "src": src_address, "target": target, "now": now_}
+                for url, targets in pages.items()
+                for target in targets
+            ]
+            if rows:
+                session.execute(
+                    text(
+                        "INSERT INTO citation_pages (url, src_address, target_address, updated_at) "
+                        "VALUES (:url, :src, :target, :now)"
+                    ),
+                    rows,
                 )
+            session.execute(
+                delete(CitationPage).where(
+                    CitationPage.src_address == src_address,
+                    CitationPage.updated_at < now_ - self._page_max_age,
+                )
+            )
+            session.execute(
+                text(
+                    "INSERT INTO citations (target_address, src_address, created_at, removed) "
+                    "SELECT DISTINCT target_address, :src, :now, 0 FROM citation_pages "
+                    "WHERE src_address = :src "
+                    "ON CONFLICT (target_address, src_address) DO UPDATE SET removed = 0 "
+                    "WHERE citations.removed"
+                ),
+                {"src": src_address, "now": now_},
+            )
+            session.execute(
+                text(
+                    "UPDATE citations SET removed = 1 "
+                    "WHERE src_address = :src AND NOT removed AND target_address NOT IN "
+                    "(SELECT target_address FROM citation_pages WHERE src_address = :src)"
+                ),
+                {"src": src_address},
+            )
+            addresses_to = set(
+                session.execute(
+                    select(CitationPage.target_address)
+                    .where(CitationPage.src_address == src_address)
+                    .distinct()
+                ).scalars()
+            )
+        self._graph.replace(src_address, addresses_to)
+
+    def forget_nodes(self, addresses: List[str]) -> None:
+        """Called after citations from and to removed nodes are marked removed."""
+        self._graph.remove_nodes(addresses)
 
     def get_citations_for(self, address: str) -> set[str]:
-        with get_session() as session:
-            rows = session.execute(
-                select(Citation.src_address).where(
-                    Citation.target_address == address,
-                    Citation.removed.is_(False),
-                )
-            ).scalars().all()
-            return set(rows) if rows else set()
+        return self._graph.cited_by(address)
 
     def get_amount_for(self, address: str) -> int:
-        return len(self.get_citations_for(address))
+        return self._graph.in_degree(address)
+
+    def edges(self) -> List[Tuple[str, str]]:
+        """
+        :return: (src, target) addresses of all not removed citations
+        """
+        return self._graph.edges()
+
+
+class CitationBatch:
+    """
+    Links of pages, crawled during one run, grouped by source node, so citations of a node
+    are updated once with all its crawled pages.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # source address -> url -> links
+        self._pages: Dict[str, Dict[str, Set[str]]] = {}
+
+    def add(self, src: str, links_to: Iterable[str]) -> None:
+        with self.__lock:
+            self._pages.setdefault(address_from_url(src), {}).setdefault(src, set()).update(links_to)
+
+    def apply(self, update_pages: Callable[[Dict[str, Iterable[str]]], None]) -> int:
+        """
+        :return: amount of updated source nodes
+        """
+        with self.__lock:
+            pages, self._pages = self._pages, {}
+        for node_pages in pages.values():
+            update_pages(node_pages)
+        return len(pages)
 
 
-citations = Citations()
+# pages are crawled at least once per maximal recrawl interval, while they are reachable
+citations = Citations(page_max_age_seconds=2 * CONFIG.CRAWLER_RECRAWL_MAX_SECONDS)
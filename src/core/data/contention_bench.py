@@ -0,0 +1,113 @@
+"""
+Database contention benchmark: writer threads upsert announces and citations like
+announce handler and crawler do, reader threads run node list queries like views do.
+Prints write throughput and read latency.
+
+Use scratch STORAGE_PATH, compare journal modes with SQLITE_JOURNAL_MODE=DELETE:
+    python -m src.core.data.contention_bench [--seconds 10] [--writers 4] [--readers 4] [--shared]
+"""
+import argparse
+import random
+import threading
+import time
+import typing as tp
+
+
+def _quantile(values: tp.List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    from sqlalchemy import func, select
+
+    from src.config import CONFIG
+    from src.core.data import nods_and_peers
+    from src.core.data.citations import citations
+    from src.core.data.db import get_read_session, get_session, init_db
+    from src.core.data.models import Node
+
+    arg_parser = argparse.ArgumentParser(description="Measure read latency under writes")
+    arg_parser.add_argument("--seconds", type=float, default=10.0)
+    arg_parser.add_argument("--writers", type=int, default=4)
+    arg_parser.add_argument("--readers", type=int, default=4)
+    arg_parser.add_argument("--nodes", type=int, default=2000)
+    arg_parser.add_argument(
+        "--shared", action="store_true", help="readers use writers' engine, as before split"
+    )
+    args = arg_parser.parse_args()
+
+    init_db()
+    with get_session() as session:
+        used = session.execute(select(func.count(Node.id))).scalar_one()
+    if used:
+        raise SystemExit("nodes table isn't empty, run benchmark with scratch STORAGE_PATH")
+    if args.shared:
+        # view functions look session factory up in their module
+        nods_and_peers.get_read_session = get_session
+    addresses = [f"{i:032x}" for i in range(args.nodes)]
+    for address in addresses:
+        nods_and_peers.upsert_node(address, address, f"node {address[-4:]}", time.time())
+
+    deadline = time.monotonic() + args.seconds
+    writes = [0] * args.writers
+    write_errors = [0] * args.writers
+    read_latencies: tp.List[tp.List[float]] = [[] for _ in range(args.readers)]
+    read_errors = [0] * args.readers
+
+    def write(n: int):
+        rnd = random.Random(n)
+        while time.monotonic() < deadline:
+            address = rnd.choice(addresses)
+            try:
+                if rnd.random() < 0.5:
+                    nods_and_peers.upsert_node(address, address, f"node {n}", time.time())
+                else:
+                    links = [f"{rnd.choice(addresses)}:/page/index.mu" for _ in range(10)]
+                    citations.update_citations(f"{address}:/page/index.mu", links)
+                writes[n] += 1
+            except Exception:
+                write_errors[n] += 1
+
+    def read(n: int):
+        rnd = random.Random(1000 + n)
+        while time.monotonic() < deadline:
+            started_at = time.perf_counter()
+            try:
+                nods_and_peers.get_nodes_page(rnd.randrange(10), 20, rnd.choice(["", "node 1"]))
+                nods_and_peers.count_nodes_filtered()
+                read_latencies[n].append(time.perf_counter() - started_at)
+            except Exception:
+                read_errors[n] += 1
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=read, args=(i,)) for i in range(args.readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with get_read_session() as session:
+        journal_mode = session.connection().exec_driver_sql("PRAGMA journal_mode").scalar()
+    latencies = [latency for thread in read_latencies for latency in thread]
+    print(
+        f"journal: {journal_mode}, readers: {'shared' if args.shared else 'read-only'} engine, "
+        f"busy timeout {CONFIG.SQLITE_BUSY_TIMEOUT_MS} ms"
+    )
+    print(
+        f"writes: {sum(writes)} in {args.seconds:.0f}s, {sum(writes) / args.seconds:.1f}/s, "
+        f"{sum(write_errors)} failed"
+    )
+    print(
+        f"reads: {len(latencies)}, {len(latencies) / args.seconds:.1f}/s, "
+        f"p50 {_quantile(latencies, 0.5) * 1000:.1f} ms, "
+        f"p95 {_quantile(latencies, 0.95) * 1000:.1f} ms, "
+        f"p99 {_quantile(latencies, 0.99) * 1000:.1f} ms, "
+        f"max {max(latencies, default=0) * 1000:.1f} ms, {sum(read_errors)} failed"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import typing as tp
+
+from sqlalchemy import insert
+
+from src.core.data.db import get_session
+from src.core.data.models import CrawlReachabilitySample
+
+
+def save_reachability_samples(
+        crawl_started_at: float, samples: tp.Iterable[tp.Tuple[str, float, bool]]
+) -> int:
+    """
+    :param samples: address, predicted p_dead, reached
+    """
+    rows = [
+        {
+            "crawl_started_at": crawl_started_at,
+            "address": address,
+            "p_dead": p_dead,
+            "reached": reached,
+        }
+        for address, p_dead, reached in samples
+    ]
+    if not rows:
+        return 0
+    with get_session() as session:
+        session.execute(insert(CrawlReachabilitySample), rows)
+    return len(rows)
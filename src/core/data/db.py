@@ -1,8 +1,11 @@
+import logging
 import os
+import time
 from contextlib import contextmanager
 from typing import Generator
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session, sessionmaker
 
 from src.config import CONFIG
@@ -14,7 +17,50 @@ _engine = create_engine(
     connect_args={"check_same_thread": False},
     echo=False,
 )
+# separate pool for view queries, so pages are served while writers hold connections
+_read_engine = create_engine(
+    f"sqlite:///{_db_path}",
+    connect_args={"check_same_thread": False},
+    echo=False,
+)
 _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+_ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_read_engine)
+# tables of name_search_tables(), which exist
+_name_search_tables: set[str] = set()
+
+
+def _apply_pragmas(dbapi_connection) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {int(CONFIG.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.execute(f"PRAGMA mmap_size = {int(CONFIG.SQLITE_MMAP_BYTES)}")
+        # negative value is size in KiB, not in pages
+        cursor.execute(f"PRAGMA cache_size = {-int(CONFIG.SQLITE_CACHE_KIB)}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+    finally:
+        cursor.close()
+
+
+@event.listens_for(_engine, "connect")
+def _on_connect(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        # persistent in database file, readers get it too
+        cursor.execute(f"PRAGMA journal_mode = {CONFIG.SQLITE_JOURNAL_MODE}")
+    finally:
+        cursor.close()
+    _apply_pragmas(dbapi_connection)
+
+
+@event.listens_for(_read_engine, "connect")
+def _on_read_connect(dbapi_connection, connection_record) -> None:
+    _apply_pragmas(dbapi_connection)
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA query_only = ON")
+    finally:
+        cursor.close()
 
 
 def init_db() -> None:
@@ -25,6 +71,14 @@ def init_db() -> None:
     _migrate_nodes_add_survival_columns()
     _migrate_peers_schema_drop_destination()
     _migrate_citations_add_removed()
+    _migrate_citation_pages_split_targets()
+    _migrate_backfill_citation_pages()
+    _migrate_crawl_visited_add_recrawl_columns()
+    _migrate_crawl_frontier_add_priority()
+    _migrate_nodes_add_rank_index()
+    _migrate_add_name_search("nodes")
+    _migrate_add_name_search("peers")
+    _migrate_backfill_search_query_stats()
 
 
 def _migrate_nodes_schema_drop_destination() -> None:
@@ -166,6 +220,149 @@ def _migrate_citations_add_removed() -> None:
         )
 
 
+def _migrate_citation_pages_split_targets() -> None:
+    with _engine.begin() as conn:
+        rows = conn.execute(text("PRAGMA table_info(citation_pages)")).fetchall()
+        columns = {row[1] for row in rows}
+        if "targets" not in columns:
+            return
+        # one row per link replaces space separated targets, table is refilled by backfill
+        # and next crawls
+        conn.execute(text("DROP TABLE citation_pages"))
+        Base.metadata.tables["citation_pages"].create(bind=conn)
+
+
+def _migrate_backfill_citation_pages() -> None:
+    with _engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM citation_pages LIMIT 1")).first():
+            return
+        # pages of older citations are unknown: rows with node address instead of url keep
+        # them, until the node's pages are crawled or they expire
+        conn.execute(
+            text(
+                "INSERT INTO citation_pages (url, src_address, target_address, updated_at) "
+                "SELECT src_address, src_address, target_address, :now "
+                "FROM citations WHERE NOT removed"
+            ),
+            {"now": time.time()},
+        )
+
+
+def _migrate_crawl_visited_add_recrawl_columns() -> None:
+    with _engine.begin() as conn:
+        rows = conn.execute(text("PRAGMA table_info(crawl_visited_urls)")).fetchall()
+        if not rows:
+            return
+        columns = {row[1] for row in rows}
+        migrations = [
+            ("content_hash", "VARCHAR(64)"),
+            ("recrawl_interval", "FLOAT"),
+            ("next_visit_at", "FLOAT"),
+        ]
+        for col, col_type in migrations:
+            if col in columns:
+                continue
+            conn.execute(text(f"ALTER TABLE crawl_visited_urls ADD COLUMN {col} {col_type}"))
+        conn.execute(
+            text("CREATE INDEX IF NOT EXISTS idx_crawl_visited_next ON crawl_visited_urls(next_visit_at)")
+        )
+
+
+def _migrate_crawl_frontier_add_priority() -> None:
+    with _engine.begin() as conn:
+        rows = conn.execute(text("PRAGMA table_info(crawl_frontier)")).fetchall()
+        if not rows:
+            return
+        columns = {row[1] for row in rows}
+        if "priority" not in columns:
+            conn.execute(
+                text("ALTER TABLE crawl_frontier ADD COLUMN priority FLOAT NOT NULL DEFAULT 0")
+            )
+        conn.execute(text("DROP INDEX IF EXISTS idx_crawl_frontier_in_queue"))
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS idx_crawl_frontier_priority "
+                "ON crawl_frontier(in_queue, priority, id)"
+            )
+        )
+
+
+def _migrate_nodes_add_rank_index() -> None:
+    with _engine.begin() as conn:
+        conn.execute(
+            text("CREATE INDEX IF NOT EXISTS idx_nodes_rank ON nodes(removed, rank, time, id)")
+        )
+
+
+def _migrate_backfill_search_query_stats() -> None:
+    with _engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM search_query_stats LIMIT 1")).first():
+            return
+        conn.execute(
+            text(
+                "INSERT INTO search_query_stats (query, last_seen, count) "
+                "SELECT query, MAX(created_at), COUNT(*) FROM search_queries GROUP BY query"
+            )
+        )
+
+
+def name_search_table(table: str) -> str | None:
+    """
+    :return: FTS5 trigram index of name and dst of nodes or peers, None if SQLite lacks it
+    """
+    fts = f"{table}_fts"
+    return fts if fts in _name_search_tables else None
+
+
+def _migrate_add_name_search(table: str) -> None:
+    fts = f"{table}_fts"
+    try:
+        with _engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": fts},
+            ).first()
+            conn.execute(
+                text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"name, dst, content='{table}', content_rowid='id', tokenize='trigram')"
+                )
+            )
+            conn.execute(
+                text(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+                    f"INSERT INTO {fts}(rowid, name, dst) VALUES (new.id, new.name, new.dst); "
+                    f"END"
+                )
+            )
+            conn.execute(
+                text(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, name, dst) "
+                    f"VALUES ('delete', old.id, old.name, old.dst); "
+                    f"END"
+                )
+            )
+            # upserts set name on every announce, index is changed only if it differs
+            conn.execute(
+                text(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF name, dst ON {table} "
+                    f"WHEN old.name IS NOT new.name OR old.dst IS NOT new.dst BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, name, dst) "
+                    f"VALUES ('delete', old.id, old.name, old.dst); "
+                    f"INSERT INTO {fts}(rowid, name, dst) VALUES (new.id, new.name, new.dst); "
+                    f"END"
+                )
+            )
+            if not exists:
+                conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    except OperationalError as e:
+        # FTS5 or trigram tokenizer (SQLite 3.34) isn't compiled in: filters fall back to LIKE
+        logging.getLogger("db").warning("Name search index for %s isn't available: %s", table, e)
+        return
+    _name_search_tables.add(fts)
+
+
 @contextmanager
 def get_session() -> Generator[Session, None, None]:
     session = _SessionLocal()
@@ -177,3 +374,14 @@ def get_session() -> Generator[Session, None, None]:
         raise
     finally:
         session.close()
+
+
+@contextmanager
+def get_read_session() -> Generator[Session, None, None]:
+    """Session for queries, that don't write: it is never committed and can't write."""
+    session = _ReadSessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
@@ -0,0 +1,70 @@
+import threading
+import time
+import typing as tp
+from collections import OrderedDict
+from dataclasses import dataclass
+
+T = tp.TypeVar("T")
+
+
+@dataclass
+class CacheStats:
+    entries: int
+    hits: int
+    misses: int
+    evictions: int
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / max(1, self.hits + self.misses)
+
+
+class DirectoryCache(tp.Generic[T]):
+    """
+    Read-through cache of node and peer lookups. Least recently used entries are evicted
+    over max_entries. Writers invalidate changed keys, ttl bounds staleness of values,
+    that change with time or are written elsewhere (rank, survival params).
+    Missing entries (None) are cached too.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.__lock = threading.Lock()
+        self._max_entries = max(1, int(max_entries))
+        self._ttl = float(ttl_seconds)
+        # key -> (loaded at, value)
+        self._entries: OrderedDict[tp.Hashable, tp.Tuple[float, T | None]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        # bumped by invalidation, so a value loaded before it isn't stored
+        self._generation = 0
+
+    def get(self, key: tp.Hashable, load: tp.Callable[[], T | None]) -> T | None:
+        now_ = time.monotonic()
+        with self.__lock:
+            entry = self._entries.get(key)
+            if entry is not None and now_ - entry[0] < self._ttl:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+            generation = self._generation
+        value = load()
+        with self.__lock:
+            if generation == self._generation:
+                self._entries[key] = (now_, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return value
+
+    def invalidate(self, keys: tp.Iterable[tp.Hashable]) -> None:
+        with self.__lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def stats(self) -> CacheStats:
+        with self.__lock:
+            return CacheStats(len(self._entries), self._hits, self._misses, self._evictions)
@@ -34,6 +34,8 @@ class Node(Base):
     __table_args__ = (
         Index("idx_nodes_identity", "identity"),
         Index("idx_nodes_time", "time"),
+        # keyset pagination of nodes list
+        Index("idx_nodes_rank", "removed", "rank", "time", "id"),
     )
 
 
@@ -70,6 +72,23 @@ class Citation(Base):
     )
 
 
+class CitationPage(Base):
+    """Node, which a crawled page links to. Citations of a node are links of all its pages."""
+
+    __tablename__ = "citation_pages"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    url: Mapped[str] = mapped_column(Text, nullable=False)
+    src_address: Mapped[str] = mapped_column(String(32), nullable=False)
+    target_address: Mapped[str] = mapped_column(String(32), nullable=False)
+    updated_at: Mapped[float] = mapped_column(Float, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("url", "target_address", name="uq_citation_page_target"),
+        Index("idx_citation_pages_src", "src_address", "target_address"),
+    )
+
+
 class SearchQuery(Base):
     __tablename__ = "search_queries"
 
@@ -80,6 +99,18 @@ class SearchQuery(Base):
     __table_args__ = (Index("idx_search_queries_created", "created_at"),)
 
 
+class SearchQueryStats(Base):
+    """Rollup of search_queries: one row per distinct query."""
+
+    __tablename__ = "search_query_stats"
+
+    query: Mapped[str] = mapped_column(Text, primary_key=True)
+    last_seen: Mapped[float] = mapped_column(Float, nullable=False)
+    count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (Index("idx_search_query_stats_last_seen", "last_seen"),)
+
+
 class UserSearchHistory(Base):
     __tablename__ = "user_search_history"
 
@@ -102,8 +133,78 @@ class CrawlVisitedUrl(Base):
     url: Mapped[str] = mapped_column(Text, unique=True, nullable=False)
     created_at: Mapped[float] = mapped_column(Float, nullable=False)
     last_visited_at: Mapped[float] = mapped_column(Float, nullable=False)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    recrawl_interval: Mapped[float | None] = mapped_column(Float, nullable=True)
+    next_visit_at: Mapped[float | None] = mapped_column(Float, nullable=True)
 
     __table_args__ = (
         Index("idx_crawl_visited_url", "url"),
         Index("idx_crawl_visited_at", "last_visited_at"),
+        Index("idx_crawl_visited_next", "next_visit_at"),
     )
+
+
+class CrawlFrontierUrl(Base):
+    __tablename__ = "crawl_frontier"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    url: Mapped[str] = mapped_column(Text, unique=True, nullable=False)
+    source_url: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[float] = mapped_column(Float, nullable=False)
+    in_queue: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    # lower goes first
+    priority: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (Index("idx_crawl_frontier_priority", "in_queue", "priority", "id"),)
+
+
+class CrawlReachabilitySample(Base):
+    """Predicted probability, that node is dead, and the outcome of crawling it."""
+
+    __tablename__ = "crawl_reachability"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    crawl_started_at: Mapped[float] = mapped_column(Float, nullable=False)
+    address: Mapped[str] = mapped_column(String(64), nullable=False)
+    p_dead: Mapped[float] = mapped_column(Float, nullable=False)
+    reached: Mapped[bool] = mapped_column(Boolean, nullable=False)
+
+    __table_args__ = (Index("idx_crawl_reachability_started", "crawl_started_at"),)
+
+
+class StoredPage(Base):
+    """Raw page in page store, blob is shared by urls with the same content_hash."""
+
+    __tablename__ = "stored_pages"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    url: Mapped[str] = mapped_column(Text, unique=True, nullable=False)
+    owner: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    # compressed size of the blob
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    fetched_at: Mapped[float] = mapped_column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("idx_stored_pages_hash", "content_hash"),
+        Index("idx_stored_pages_fetched", "fetched_at"),
+    )
+
+
+class CrawlStageStats(Base):
+    """Histogram of one crawl stage timings during one crawl run."""
+
+    __tablename__ = "crawl_stage_stats"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    crawl_started_at: Mapped[float] = mapped_column(Float, nullable=False)
+    stage: Mapped[str] = mapped_column(String(32), nullable=False)
+    count: Mapped[int] = mapped_column(Integer, nullable=False)
+    total_seconds: Mapped[float] = mapped_column(Float, nullable=False)
+    max_seconds: Mapped[float] = mapped_column(Float, nullable=False)
+    p50_seconds: Mapped[float] = mapped_column(Float, nullable=False)
+    p95_seconds: Mapped[float] = mapped_column(Float, nullable=False)
+    # JSON list of bucket counts, bounds are telemetry.BUCKETS
+    buckets: Mapped[str] = mapped_column(Text, nullable=False)
+
+    __table_args__ = (Index("idx_crawl_stage_stats_started", "crawl_started_at"),)
@@ -1,17 +1,46 @@
 import time
 import typing as tp
 
-from sqlalchemy import desc, func, or_, select, update
+from sqlalchemy import column, desc, func, or_, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from src.core.data.db import get_session
+from src.config import CONFIG
+from src.core.data.citations import citations
+from src.core.data.db import get_read_session, get_session, name_search_table
+from src.core.data.directory_cache import CacheStats, DirectoryCache
 from src.core.data.models import Citation, Node, Peer
+from src.core.data.pagination import Page, fetch_page
 from src.core.search.nodes_downtime import PRIOR_ANNOUNCE, dead_probability_ci
 
 
+# dst -> node, identity -> (name, dst) of peer
+_nodes_cache: DirectoryCache[dict] = DirectoryCache(
+    CONFIG.DIRECTORY_CACHE_MAX_ENTRIES, CONFIG.DIRECTORY_CACHE_TTL_SECONDS
+)
+_owners_cache: DirectoryCache[tp.Tuple[str, str]] = DirectoryCache(
+    CONFIG.DIRECTORY_CACHE_MAX_ENTRIES, CONFIG.DIRECTORY_CACHE_TTL_SECONDS
+)
+
+
 def _now() -> float:
     return time.time()
 
 
+def _name_filter(model: tp.Type[Node] | tp.Type[Peer], query: str):
+    """Case insensitive substring of name or dst."""
+    fts = name_search_table(model.__tablename__)
+    # trigram index can't find shorter strings
+    if fts is None or len(query) < 3:
+        like = f"%{query}%"
+        return (model.name.ilike(like)) | (model.dst.ilike(like))
+    phrase = '"' + query.replace('"', '""') + '"'
+    return model.id.in_(
+        text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :phrase")
+        .bindparams(phrase=phrase)
+        .columns(column("rowid"))
+    )
+
+
 def _node_to_dict(row: Node) -> dict:
     now_ts = _now()
     alpha = float(row.announce_alpha) if row.announce_alpha is not None else float(PRIOR_ANNOUNCE[0])
@@ -74,46 +103,52 @@ def get_peers() -> dict:
         }
 
 
-def get_nodes_page(page: int = 0, page_size: int = 100, query: str = "") -> list[dict]:
+def get_nodes_page(
+        page: int = 0, page_size: int = 100, query: str = "", after: str = "", before: str = ""
+) -> Page[dict]:
+    """
+    Nodes by rank, then by last announce.
+
+    :param after: next_cursor of the previous page, page is ignored
+    :param before: prev_cursor of the next page, page is ignored
+    """
     page = max(0, int(page))
     page_size = max(1, min(int(page_size), 1000))
 
-    with get_session() as session:
-        q = select(Node).where(Node.removed.is_(False)).order_by(desc(Node.rank), desc(Node.time))
+    with get_read_session() as session:
+        q = select(Node).where(Node.removed.is_(False))
         if query:
-            like = f"%{query}%"
-            q = q.where((Node.name.ilike(like)) | (Node.dst.ilike(like)))
-
-        rows = (
-            session.execute(q.offset(page * page_size).limit(page_size))
-            .scalars()
-            .all()
+            q = q.where(_name_filter(Node, query))
+        result = fetch_page(
+            session, q, (Node.rank, Node.time, Node.id), page, page_size, after, before
         )
-        return [_node_to_dict(r) for r in rows]
+        result.items = [_node_to_dict(r) for r in result.items]
+        return result
 
 
-def get_peers_page(page: int = 0, page_size: int = 100, query: str = "") -> list[dict]:
+def get_peers_page(
+        page: int = 0, page_size: int = 100, query: str = "", after: str = "", before: str = ""
+) -> Page[dict]:
+    """
+    Peers by last announce, cursors are the same as in get_nodes_page.
+    """
     page = max(0, int(page))
     page_size = max(1, min(int(page_size), 1000))
 
-    with get_session() as session:
-        q = select(Peer).order_by(desc(Peer.time))
+    with get_read_session() as session:
+        q = select(Peer)
         if query:
-            like = f"%{query}%"
-            q = q.where((Peer.name.ilike(like)) | (Peer.dst.ilike(like)))
-        rows = (
-            session.execute(q.offset(page * page_size).limit(page_size))
-            .scalars()
-            .all()
-        )
-        return [_peer_to_dict(r) for r in rows]
+            q = q.where(_name_filter(Peer, query))
+        result = fetch_page(session, q, (Peer.time, Peer.id), page, page_size, after, before)
+        result.items = [_peer_to_dict(r) for r in result.items]
+        return result
 
 
 def get_nodes_for_addresses(addresses: tp.Iterable[str]) -> list[dict]:
     addresses = list(addresses)
     if not addresses:
         return []
-    with get_session() as session:
+    with get_read_session() as session:
         rows = session.execute(
             select(Node).where(Node.dst.in_(addresses), Node.removed.is_(False))
         ).scalars().all()
@@ -131,59 +166,103 @@ def get_recent_nodes_for_crawl(within_seconds: int = 86400) -> list[str]:
         return list(rows)
 
 
-def count_nodes() -> int:
+def get_node_dead_probabilities() -> dict[str, float]:
+    """Return dst -> probability, that node is dead (middle of 90% interval)."""
+    now_ts = _now()
     with get_session() as session:
+        rows = session.execute(
+            select(Node.dst, Node.time, Node.announce_alpha, Node.announce_beta)
+            .where(Node.removed.is_(False))
+        ).all()
+    result = {}
+    for dst, time_, alpha, beta in rows:
+        p_dead_low, p_dead_high = dead_probability_ci(
+            float(alpha) if alpha is not None else float(PRIOR_ANNOUNCE[0]),
+            float(beta) if beta is not None else float(PRIOR_ANNOUNCE[1]),
+            max(0.0, now_ts - float(time_)),
+            ci=0.90,
+        )
+        result[dst] = (p_dead_low + p_dead_high) / 2.0
+    return result
+
+
+def count_nodes() -> int:
+    with get_read_session() as session:
         return int(
             session.execute(select(func.count(Node.id)).where(Node.removed.is_(False))).scalar_one()
         )
 
 
 def count_peers() -> int:
-    with get_session() as session:
+    with get_read_session() as session:
         return int(session.execute(select(func.count(Peer.id))).scalar_one())
 
 
 def count_nodes_filtered(query: str = "") -> int:
-    with get_session() as session:
+    with get_read_session() as session:
         q = select(func.count(Node.id)).where(Node.removed.is_(False))
         if query:
-            like = f"%{query}%"
-            q = q.where((Node.name.ilike(like)) | (Node.dst.ilike(like)))
+            q = q.where(_name_filter(Node, query))
         return int(session.execute(q).scalar_one())
 
 
 def count_peers_filtered(query: str = "") -> int:
-    with get_session() as session:
+    with get_read_session() as session:
         q = select(func.count(Peer.id))
         if query:
-            like = f"%{query}%"
-            q = q.where((Peer.name.ilike(like)) | (Peer.dst.ilike(like)))
+            q = q.where(_name_filter(Peer, query))
         return int(session.execute(q).scalar_one())
 
 
+# dst, identity, name, time
+Announce = tp.Tuple[str, str, str, float]
+
+
 def upsert_node(dst: str, identity: str, name: str, ts: float) -> None:
+    upsert_nodes([(dst, identity, name, ts)])
+
+
+def upsert_nodes(announces: tp.Iterable[Announce]) -> int:
+    """
+    Inserts or updates nodes in one statement, announced nodes are restored if removed.
+
+    :return: amount of upserted nodes
+    """
+    now_ = _now()
+    values = [
+        dict(
+            dst=dst,
+            identity=identity,
+            name=name,
+            time=ts,
+            created_at=now_,
+            updated_at=now_,
+            rank=0.0,
+            removed=False,
+        )
+        for dst, identity, name, ts in announces
+    ]
+    if not values:
+        return 0
+    stmt = sqlite_insert(Node)
+    _nodes_cache.invalidate([v["dst"] for v in values])
     with get_session() as session:
-        row = session.execute(select(Node).where(Node.dst == dst)).scalars().first()
-        now_ = _now()
-        if row:
-            row.identity = identity
-            row.name = name
-            row.time = ts
-            row.updated_at = now_
-            row.removed = False
-        else:
-            session.add(
-                Node(
-                    dst=dst,
-                    identity=identity,
-                    name=name,
-                    time=ts,
-                    created_at=now_,
-                    updated_at=now_,
-                    rank=0.0,
-                    removed=False,
-                )
-            )
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["dst"],
+                set_={
+                    "identity": stmt.excluded.identity,
+                    "name": stmt.excluded.name,
+                    "time": stmt.excluded.time,
+                    "updated_at": stmt.excluded.updated_at,
+                    "removed": False,
+                },
+            ),
+            values,
+        )
+    # again: lookups, started during write, could cache old row
+    _nodes_cache.invalidate([v["dst"] for v in values])
+    return len(values)
 
 
 def mark_stale_nodes_removed(
@@ -209,33 +288,55 @@ def mark_stale_nodes_removed(
                 )
                 .values(removed=True)
             )
+    if removed_addresses:
+        _nodes_cache.invalidate(removed_addresses)
+        citations.forget_nodes(removed_addresses)
     return removed_addresses
 
 
 def upsert_peer(dst: str, identity: str, name: str, ts: float) -> None:
+    upsert_peers([(dst, identity, name, ts)])
+
+
+def upsert_peers(announces: tp.Iterable[Announce]) -> int:
+    """
+    :return: amount of upserted peers
+    """
+    now_ = _now()
+    values = [
+        dict(dst=dst, identity=identity, name=name, time=ts, created_at=now_, updated_at=now_)
+        for dst, identity, name, ts in announces
+    ]
+    if not values:
+        return 0
+    stmt = sqlite_insert(Peer)
+    _owners_cache.invalidate([v["identity"] for v in values])
     with get_session() as session:
-        row = session.execute(select(Peer).where(Peer.dst == dst)).scalars().first()
-        now_ = _now()
-        if row:
-            row.identity = identity
-            row.name = name
-            row.time = ts
-            row.updated_at = now_
-        else:
-            session.add(
-                Peer(
-                    dst=dst,
-                    identity=identity,
-                    name=name,
-                    time=ts,
-                    created_at=now_,
-                    updated_at=now_,
-                )
-            )
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["dst"],
+                set_={
+                    "identity": stmt.excluded.identity,
+                    "name": stmt.excluded.name,
+                    "time": stmt.excluded.time,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            ),
+            values,
+        )
+    _owners_cache.invalidate([v["identity"] for v in values])
+    return len(values)
 
 
 def find_owner(identity: str) -> tp.Optional[tp.Tuple[str, str]]:
-    with get_session() as session:
+    """
+    :return: name and dst of peer with identity
+    """
+    return _owners_cache.get(identity, lambda: _load_owner(identity))
+
+
+def _load_owner(identity: str) -> tp.Optional[tp.Tuple[str, str]]:
+    with get_read_session() as session:
         row = session.execute(select(Peer).where(Peer.identity == identity)).scalars().first()
         if row is None:
             return None
@@ -243,7 +344,13 @@ def find_owner(identity: str) -> tp.Optional[tp.Tuple[str, str]]:
 
 
 def find_node_by_address(address: str) -> tp.Optional[dict]:
-    with get_session() as session:
+    node = _nodes_cache.get(address, lambda: _load_node(address))
+    # callers may change it
+    return dict(node) if node is not None else None
+
+
+def _load_node(address: str) -> tp.Optional[dict]:
+    with get_read_session() as session:
         row = session.execute(
             select(Node).where(Node.dst == address, Node.removed.is_(False))
         ).scalars().first()
@@ -251,3 +358,6 @@ def find_node_by_address(address: str) -> tp.Optional[dict]:
             return None
         return _node_to_dict(row)
 
+
+def directory_cache_stats() -> tp.Dict[str, CacheStats]:
+    return {"nodes": _nodes_cache.stats(), "owners": _owners_cache.stats()}
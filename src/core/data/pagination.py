@@ -0,0 +1,120 @@
+import base64
+import binascii
+import json
+import threading
+import time
+import typing as tp
+from dataclasses import dataclass
+
+from sqlalchemy import Select, literal, tuple_
+from sqlalchemy.orm import Session
+
+T = tp.TypeVar("T")
+
+
+@dataclass
+class Page(tp.Generic[T]):
+    items: tp.List[T]
+    # tokens for "before" and "after" parameters, empty on the first and the last page
+    prev_cursor: str = ""
+    next_cursor: str = ""
+
+
+def encode_cursor(key: tp.Sequence[tp.Any]) -> str:
+    # urlsafe alphabet without padding doesn't clash with Micron link syntax
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> tp.Tuple[tp.Any, ...] | None:
+    """
+    :return: None for empty or malformed token
+    """
+    if not token:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(key, list) or len(key) != size:
+        return None
+    return tuple(key)
+
+
+def fetch_page(
+        session: Session,
+        stmt: Select,
+        key_columns: tp.Sequence[tp.Any],
+        page: int,
+        page_size: int,
+        after: str = "",
+        before: str = "",
+) -> Page:
+    """
+    Rows of stmt ordered by key_columns descending. Neighbour pages are found by key of
+    the first or the last row (keyset), so they don't scan previous rows. Without cursor
+    page is taken by offset, it is for jumps to arbitrary pages.
+
+    :param key_columns: unique together, with index in the same order
+    """
+    key = tuple_(*key_columns)
+    before_key = decode_cursor(before, len(key_columns))
+    after_key = decode_cursor(after, len(key_columns))
+    if before_key is not None:
+        rows = session.execute(
+            stmt.where(key > tuple_(*(literal(v) for v in before_key)))
+            .order_by(*(c.asc() for c in key_columns))
+            .limit(page_size + 1)
+        ).scalars().all()
+        has_prev = len(rows) > page_size
+        rows = list(reversed(rows[:page_size]))
+        has_next = True
+    else:
+        stmt = stmt.order_by(*(c.desc() for c in key_columns)).limit(page_size + 1)
+        if after_key is not None:
+            stmt = stmt.where(key < tuple_(*(literal(v) for v in after_key)))
+        else:
+            stmt = stmt.offset(page * page_size)
+        rows = session.execute(stmt).scalars().all()
+        has_prev = after_key is not None or page > 0
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+    def row_key(row) -> tp.List[tp.Any]:
+        return [getattr(row, c.key) for c in key_columns]
+
+    return Page(
+        items=rows,
+        prev_cursor=encode_cursor(row_key(rows[0])) if rows and has_prev else "",
+        next_cursor=encode_cursor(row_key(rows[-1])) if rows and has_next else "",
+    )
+
+
+class CountCache:
+    """
+    Row counts for page totals. Exact count is a full scan of matching rows, so it is
+    reused for ttl seconds: totals may lag behind a bit.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1000):
+        self.__lock = threading.Lock()
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._counts: tp.Dict[tp.Hashable, tp.Tuple[float, int]] = {}
+
+    def invalidate(self, key: tp.Hashable) -> None:
+        with self.__lock:
+            self._counts.pop(key, None)
+
+    def get(self, key: tp.Hashable, count: tp.Callable[[], int]) -> int:
+        now_ = time.monotonic()
+        with self.__lock:
+            cached = self._counts.get(key)
+        if cached is not None and now_ - cached[0] < self._ttl:
+            return cached[1]
+        value = count()
+        with self.__lock:
+            if len(self._counts) >= self._max_entries:
+                self._counts.clear()
+            self._counts[key] = (now_, value)
+        return value
@@ -1,9 +1,13 @@
 import time
-from typing import List
+from contextlib import nullcontext
+from typing import Iterable, List, Tuple
 
-from sqlalchemy import desc, func, select
-from src.core.data.db import get_session
-from src.core.data.models import SearchQuery
+from sqlalchemy import delete, desc, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.core.data.db import get_read_session, get_session
+from src.core.data.models import SearchQuery, SearchQueryStats
 
 
 def _now() -> float:
@@ -11,19 +15,64 @@ def _now() -> float:
 
 
 def add_search_query(query: str) -> None:
-    with get_session() as session:
-        session.add(SearchQuery(query=query.strip(), created_at=_now()))
+    add_search_queries([(query, _now())])
+
+
+def add_search_queries(
+        queries: Iterable[Tuple[str, float]], session: Session | None = None
+) -> None:
+    """
+    :param queries: query and time of search
+    :param session: to write in the transaction of caller, committed by caller
+    """
+    values = [{"query": query.strip(), "created_at": ts} for query, ts in queries]
+    if not values:
+        return
+    # rollup of this batch, added to search_query_stats
+    stats: dict[str, dict] = {}
+    for v in values:
+        row = stats.setdefault(v["query"], {"query": v["query"], "last_seen": 0.0, "count": 0})
+        row["last_seen"] = max(row["last_seen"], v["created_at"])
+        row["count"] += 1
+    stmt = sqlite_insert(SearchQueryStats)
+    with nullcontext(session) if session is not None else get_session() as session:
+        session.execute(insert(SearchQuery), values)
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["query"],
+                set_={
+                    "last_seen": func.max(SearchQueryStats.last_seen, stmt.excluded.last_seen),
+                    "count": SearchQueryStats.count + stmt.excluded.count,
+                },
+            ),
+            list(stats.values()),
+        )
 
 
 def get_last_search_queries(limit: int = 200) -> List[str]:
     """Return unique recent query strings (newest first)."""
-    with get_session() as session:
-        last_ts = func.max(SearchQuery.created_at).label("last_ts")
-        last_id = func.max(SearchQuery.id).label("last_id")
+    with get_read_session() as session:
         rows = session.execute(
-            select(SearchQuery.query, last_ts, last_id)
-            .group_by(SearchQuery.query)
-            .order_by(desc(last_ts), desc(last_id))
+            select(SearchQueryStats.query)
+            .order_by(desc(SearchQueryStats.last_seen))
             .limit(limit)
-        ).all()
-        return [row[0] for row in rows] if rows else []
+        ).scalars().all()
+        return list(rows)
+
+
+def prune_search_query_stats(max_rows: int) -> int:
+    """
+    Keeps max_rows the most recently searched queries.
+
+    :return: amount of deleted rows
+    """
+    with get_session() as session:
+        kept = (
+            select(SearchQueryStats.query)
+            .order_by(desc(SearchQueryStats.last_seen))
+            .limit(max(0, max_rows))
+        )
+        res = session.execute(
+            delete(SearchQueryStats).where(SearchQueryStats.query.not_in(kept))
+        )
+        return res.rowcount
@@ -0,0 +1,100 @@
+import time
+import typing as tp
+from dataclasses import dataclass
+
+from src.config import CONFIG
+from src.core.data.db import get_session
+from src.core.data.queries import add_search_queries
+from src.core.data.user_search_history import user_search_history
+from src.core.data.write_behind import WriteBehindBuffer
+
+
+@dataclass
+class SearchLogStats:
+    depth: int
+    flushes: int
+    flushed: int
+    dropped: int
+    last_flush_seconds: float
+
+
+class SearchLogBuffer(WriteBehindBuffer):
+    """
+    Search queries and user history, waiting to be written. Search responses only append
+    here.
+    """
+
+    def __init__(self, flush_interval_seconds: float, max_entries: int):
+        super().__init__("search-log", flush_interval_seconds, max_entries)
+        # query, time
+        self._queries: tp.List[tp.Tuple[str, float]] = []
+        # remote identity, query, time
+        self._history: tp.List[tp.Tuple[str, str, float]] = []
+        self._flushes = 0
+        self._flushed = 0
+        self._dropped = 0
+        self._last_flush_seconds = 0.0
+        # called with identities, which history was written
+        self.on_history_flushed: tp.Callable[[tp.Set[str]], None] | None = None
+
+    def add_query(self, query: str, ts: float) -> None:
+        with self._cond:
+            self._queries.append((query, ts))
+            self._added_locked()
+
+    def add_history(self, remote_identity: str, query: str, ts: float) -> None:
+        with self._cond:
+            self._history.append((remote_identity, query, ts))
+            self._added_locked()
+
+    def _depth_locked(self) -> int:
+        return len(self._queries) + len(self._history)
+
+    def flush(self) -> int:
+        """
+        :return: amount of written entries
+        """
+        with self._flush_lock:
+            with self._cond:
+                queries, self._queries = self._queries, []
+                history, self._history = self._history, []
+            if not queries and not history:
+                return 0
+            started_at = time.perf_counter()
+            try:
+                # one transaction, so a retry doesn't write queries twice
+                with get_session() as session:
+                    add_search_queries(queries, session)
+                    user_search_history.add_many(history, session)
+            except Exception as e:
+                self._logger.warning("Error during flush of %s queries: %s", len(queries), e)
+                with self._cond:
+                    self._failed_locked()
+                    # retried with the next flush, while database is unavailable only
+                    # the latest entries are kept
+                    pending = len(queries) + len(history) + len(self._queries) + len(self._history)
+                    self._queries = (queries + self._queries)[-self._max_entries:]
+                    self._history = (history + self._history)[-self._max_entries:]
+                    self._dropped += pending - len(self._queries) - len(self._history)
+                return 0
+            elapsed = time.perf_counter() - started_at
+            with self._cond:
+                self._flushes += 1
+                self._flushed += len(queries) + len(history)
+                self._last_flush_seconds = elapsed
+            if history and self.on_history_flushed:
+                self.on_history_flushed({remote_identity for remote_identity, _, _ in history})
+            return len(queries) + len(history)
+
+    def stats(self) -> SearchLogStats:
+        with self._cond:
+            return SearchLogStats(
+                depth=self._depth_locked(),
+                flushes=self._flushes,
+                flushed=self._flushed,
+                dropped=self._dropped,
+                last_flush_seconds=self._last_flush_seconds,
+            )
+
+
+search_log = SearchLogBuffer(CONFIG.SEARCH_LOG_FLUSH_SECONDS, CONFIG.SEARCH_LOG_MAX_ENTRIES)
@@ -1,49 +1,81 @@
 import time
-from typing import List
+from contextlib import nullcontext
+from typing import Iterable, Tuple
 
-from sqlalchemy import desc, func, select
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
 
-from src.core.data.db import get_session
+from src.core.data.db import get_read_session, get_session
 from src.core.data.models import UserSearchHistory as UserSearchHistoryRow
+from src.core.data.pagination import Page, fetch_page
 
 
 class UserSearchHistory:
     def add(self, remote_identity: str, query: str, ts: float | None = None) -> None:
-        q = (query or "").strip()
-        if not remote_identity or not q:
-            return
+        self.add_many([(remote_identity, query, ts)])
+
+    def add_many(
+        self,
+        entries: Iterable[Tuple[str, str, float | None]],
+        session: Session | None = None,
+    ) -> None:
+        """
+        :param entries: remote identity, query and time of search
+        :param session: to write in the transaction of caller, committed by caller
+        """
         now_ = time.time()
-        with get_session() as session:
-            session.add(
-                UserSearchHistoryRow(
-                    remote_identity=remote_identity,
-                    query=q,
-                    time=float(ts if ts is not None else now_),
-                    created_at=now_,
-                )
+        values = []
+        for remote_identity, query, ts in entries:
+            q = (query or "").strip()
+            if not remote_identity or not q:
+                continue
+            values.append(
+                {
+                    "remote_identity": remote_identity,
+                    "query": q,
+                    "time": float(ts if ts is not None else now_),
+                    "created_at": now_,
+                }
             )
+        if not values:
+            return
+        with nullcontext(session) if session is not None else get_session() as session:
+            session.execute(insert(UserSearchHistoryRow), values)
 
     def list(
-        self, remote_identity: str, page: int = 0, page_size: int = 20
-    ) -> List[dict]:
+        self,
+        remote_identity: str,
+        page: int = 0,
+        page_size: int = 20,
+        after: str = "",
+        before: str = "",
+    ) -> Page[dict]:
+        """
+        Newest first, cursors are the same as in get_nodes_page.
+        """
         if not remote_identity:
-            return []
+            return Page([])
         page = max(0, int(page))
         page_size = max(1, min(int(page_size), 1000))
-        with get_session() as session:
-            rows = session.execute(
-                select(UserSearchHistoryRow.query, UserSearchHistoryRow.time)
-                .where(UserSearchHistoryRow.remote_identity == remote_identity)
-                .order_by(desc(UserSearchHistoryRow.time), desc(UserSearchHistoryRow.id))
-                .offset(page * page_size)
-                .limit(page_size)
-            ).all()
-        return [{"q": q, "time": ts} for q, ts in rows]
+        with get_read_session() as session:
+            result = fetch_page(
+                session,
+                select(UserSearchHistoryRow).where(
+                    UserSearchHistoryRow.remote_identity == remote_identity
+                ),
+                (UserSearchHistoryRow.time, UserSearchHistoryRow.id),
+                page,
+                page_size,
+                after,
+                before,
+            )
+            result.items = [{"q": row.query, "time": row.time} for row in result.items]
+        return result
 
     def count(self, remote_identity: str) -> int:
         if not remote_identity:
             return 0
-        with get_session() as session:
+        with get_read_session() as session:
             return int(
                 session.execute(
                     select(func.count(UserSearchHistoryRow.id)).where(
@@ -0,0 +1,63 @@
+import atexit
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class WriteBehindBuffer(ABC):
+    """
+    Entries, waiting to be written. Background thread flushes them every flush interval
+    or, when buffer is full, at once, so callers don't wait for database commits.
+    Entries of the last flush interval are lost on crash, on normal exit they are flushed.
+
+    Subclasses keep entries under _cond, call _added_locked after adding and
+    _failed_locked when flush fails.
+    """
+
+    def __init__(self, name: str, flush_interval_seconds: float, max_entries: int):
+        self._cond = threading.Condition()
+        self._name = name
+        self._logger = logging.getLogger(name)
+        self._flush_interval = max(0.01, float(flush_interval_seconds))
+        self._max_entries = max(1, int(max_entries))
+        # one flush at a time, so an older batch can't overwrite a newer one
+        self._flush_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._failed_at = 0.0
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    @abstractmethod
+    def flush(self) -> int:
+        """
+        :return: amount of written entries
+        """
+
+    @abstractmethod
+    def _depth_locked(self) -> int:
+        pass
+
+    def _added_locked(self) -> None:
+        if self._depth_locked() >= self._max_entries:
+            self._cond.notify()
+
+    def _failed_locked(self) -> None:
+        self._failed_at = time.monotonic()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                # after failure full buffer waits for interval too, not to retry in a loop
+                self._cond.wait_for(
+                    lambda: self._depth_locked() >= self._max_entries
+                    and time.monotonic() - self._failed_at >= self._flush_interval,
+                    self._flush_interval,
+                )
+            self.flush()
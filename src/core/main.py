@@ -1,17 +1,22 @@
-from threading import Thread
-
-from src.core.data.nods_and_peers import mark_stale_nodes_removed, upsert_node
-from src.core.search.pagerank import pagerank
-from src.core.search.nodes_downtime import recalc_node_survival_params
-from src.config import CONFIG
-from src.core.data.citations import citations
-from src.core.data.nods_and_peers import find_node_by_address
-from src.core.utils import get_process_rss_bytes, now
+# Only imports inside main: processes of crawler parse pool are spawned and re-import the
+# main module as __mp_main__, importing config there would set up log handlers on the same
+# files and importing search would open the index.
 
 
 def main():
     import logging
-
+    from threading import Thread
+
+    from src.core.data.nods_and_peers import mark_stale_nodes_removed, upsert_node
+    from src.core.search.pagerank import pagerank
+    from src.core.search.nodes_downtime import recalc_node_survival_params
+    from src.config import CONFIG
+    from src.core.data.citations import citations
+    from src.core.data.queries import prune_search_query_stats
+    from src.core.data.nods_and_peers import directory_cache_stats, find_node_by_address
+    from src.core.crawler.memory import in_flight_pages
+    from src.core.data.announce_buffer import announce_buffer
+    from src.core.utils import get_process_rss_bytes, now
     from src.core.data.db import init_db
 
     init_db()
@@ -37,7 +42,7 @@ def main():
     def start_crawling_in_thread():
         Thread(
             target=crawl,
-            args=(find_node_name_by_address, citations.update_citations),
+            args=(find_node_name_by_address, citations.update_pages),
             daemon=True,
         ).start()
 
@@ -46,6 +51,8 @@ def main():
         if removed_addresses:
             search_engine.delete_by_address(removed_addresses)
         logging.getLogger("remove-stale-nodes").info("removed %s nodes", len(removed_addresses))
+        pruned = prune_search_query_stats(CONFIG.SEARCH_QUERY_STATS_MAX_ROWS)
+        logging.getLogger("remove-stale-nodes").info("pruned %s search query stats", pruned)
 
     def recalc_node_survival():
         updated = recalc_node_survival_params(lookback_days=14)
@@ -56,7 +63,45 @@ def main():
         if rss_bytes is None:
             return
         rss_mb = rss_bytes / (1024 * 1024)
-        logging.getLogger("memory").info("Process RSS: %.2f MB", rss_mb)
+        pages = in_flight_pages.stats()
+        logging.getLogger("memory").info(
+            "Process RSS: %.2f MB, crawler pages in flight: %s (%.2f MB, peak %.2f MB), "
+            "largest page %.2f MB, rejected as too large %s",
+            rss_mb,
+            pages.documents,
+            pages.bytes / (1024 * 1024),
+            pages.peak_bytes / (1024 * 1024),
+            pages.largest_bytes / (1024 * 1024),
+            pages.rejected,
+        )
+
+    def log_announce_buffer():
+        stats = announce_buffer.stats()
+        logging.getLogger("announce-buffer").info(
+            "depth %s (peak %s), received %s, coalesced %s, written %s in %s flushes, "
+            "failed %s, last flush %.1f ms, max %.1f ms",
+            stats.depth,
+            stats.peak_depth,
+            stats.received,
+            stats.coalesced,
+            stats.flushed,
+            stats.flushes,
+            stats.failed,
+            stats.last_flush_seconds * 1000,
+            stats.max_flush_seconds * 1000,
+        )
+
+    def log_directory_cache():
+        for name, stats in directory_cache_stats().items():
+            logging.getLogger("directory-cache").info(
+                "%s: %s entries, hit rate %.1f%% (%s hits, %s misses), %s evicted",
+                name,
+                stats.entries,
+                stats.hit_rate * 100,
+                stats.hits,
+                stats.misses,
+                stats.evictions,
+            )
 
     app.scheduler.every(10).minutes.do(
         lambda: logging.getLogger("announce").debug(
@@ -69,6 +114,8 @@ def main():
     app.scheduler.every(6).hours.do(recalc_node_survival)
     app.scheduler.every(1).days.do(remove_stale_nodes)
     app.scheduler.every(5).minutes.do(log_rss_usage)
+    app.scheduler.every(5).minutes.do(log_announce_buffer)
+    app.scheduler.every(5).minutes.do(log_directory_cache)
     app.scheduler.every(1).hours.do(start_crawling_in_thread)
 
     register_filters()
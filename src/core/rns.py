@@ -7,7 +7,7 @@ import RNS
 
 from src.api import create_rns_dest
 from src.config import CONFIG
-from src.core.data.nods_and_peers import upsert_node, upsert_peer
+from src.core.data.announce_buffer import KIND_NODE, KIND_PEER, announce_buffer
 from src.core.utils import now
 import RNS.vendor.umsgpack as msgpack
 
@@ -45,10 +45,11 @@ class AnnounceHandler:
                     ensure_ascii=False,
                 )
             )
-            upsert_node(dst_clean, f"{announced_identity.hexhash}", name, ts)
+            announce_buffer.add(KIND_NODE, dst_clean, f"{announced_identity.hexhash}", name, ts)
         else:
-            upsert_peer(dst_clean, f"{announced_identity.hexhash}", name, ts)
+            announce_buffer.add(KIND_PEER, dst_clean, f"{announced_identity.hexhash}", name, ts)
 
 
+announce_buffer.start()
 RNS.Transport.register_announce_handler(AnnounceHandler("lxmf.delivery", "peers"))
 RNS.Transport.register_announce_handler(AnnounceHandler("nomadnetwork.node", "nodes"))
@@ -36,6 +36,8 @@ class SearchResult:
     p_dead_high: float | None = None
     time: float | None = None
     since_announce: str | None = None
+    # current name from nodes table, None if node is unknown or removed
+    node_name: str | None = None
 
     # highlighted_text: Optional[str] = None
     # highlighted_node_name: Optional[str] = None
@@ -6,8 +6,9 @@ from typing import Hashable, Iterable, Sequence
 
 from sqlalchemy import bindparam, select, update
 
+from src.core.data.citations import citations
 from src.core.data.db import get_session
-from src.core.data.models import Citation, Node
+from src.core.data.models import Node
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -16,12 +17,8 @@ def pagerank(batch_size: int = 500) -> dict[Hashable, float]:
     if batch_size < 1:
         raise ValueError(f"batch_size must be >= 1, got {batch_size}")
 
+    edges = citations.edges()
     with get_session() as session:
-        edges = session.execute(
-            select(Citation.src_address, Citation.target_address).where(
-                Citation.removed.is_(False)
-            )
-        ).all()
         vertices = session.execute(
             select(Node.dst).where(Node.removed.is_(False))
         ).scalars().all()
@@ -4,7 +4,7 @@ from typing import List, Sequence
 
 from sqlalchemy import select
 
-from src.core.data.db import get_session
+from src.core.data.db import get_read_session
 from src.core.data.models import Node
 import numpy as np
 
@@ -34,7 +34,9 @@ class Ranker:
             return []
 
         features = self._get_node_features([r.address for r in results])
-        ranks, p_dead_low, p_dead_high, last_seen_ts = map(np.array, zip(*features))
+        ranks, p_dead_low, p_dead_high, last_seen_ts = map(
+            np.array, zip(*(f[:4] for f in features))
+        )
         text_scores = np.array([r.score for r in results], dtype=float)
 
         text_scores_norm = self._minmax(text_scores)
@@ -69,6 +71,7 @@ class Ranker:
                 p_dead_low=float(p_dead_low[i]),
                 p_dead_high=float(p_dead_high[i]),
                 time=float(last_seen_ts[i]),
+                node_name=features[i][4],
             )
             scored_rows.append((ranked_result, float(p_dead_low[i])))
 
@@ -88,18 +91,21 @@ class Ranker:
         return text_scores_norm
 
     @staticmethod
-    def _get_node_features(addresses: Sequence[str]) -> List[tuple[float, float, float, float]]:
+    def _get_node_features(
+            addresses: Sequence[str],
+    ) -> List[tuple[float, float, float, float, str | None]]:
         """
 
         :param addresses:
-        :return: List[pagerank]
+        :return: List[(pagerank, p_dead_low, p_dead_high, last announce, node name)]
         """
         unique_addresses = set(dict.fromkeys(addresses))
         now_ts = time.time()
-        with get_session() as session:
+        with get_read_session() as session:
             rows = session.execute(
                 select(
                     Node.dst,
+                    Node.name,
                     Node.rank,
                     Node.time,
                     Node.announce_alpha,
@@ -118,11 +124,12 @@ class Ranker:
                         max(0.0, float(now_ts) - float(last_seen_ts)),
                     ),
                     float(last_seen_ts),
+                    name,
                 )
-                for dst, rank, last_seen_ts, announce_alpha, announce_beta in rows
+                for dst, name, rank, last_seen_ts, announce_alpha, announce_beta in rows
             }
 
-        return [res.get(addr, (0.0, 0.0, 0.0, 0.0)) for addr in addresses]
+        return [res.get(addr, (0.0, 0.0, 0.0, 0.0, None)) for addr in addresses]
 
     @staticmethod
     def _filter_duplicates(results: List[SearchResult]) -> List[SearchResult]:
@@ -41,18 +41,21 @@ class SearchEngine:
         self._index_batch_size = 10
         self._optimize_every_batches = 25
         self._batches_since_optimize = 0
+        # index writer commits since start, for crawl benchmarks
+        self.commits = 0
+        self.commit_seconds = 0.0
         self._query_cache: "OrderedDict[str, tuple[float, list[SearchResult]]]" = OrderedDict()
 
         self._query_cache_ttl_seconds = 300
         self._query_cache_max_entries = 200
 
         self.schema.add("raw", STORED())
-        storage_path = get_path("search_index")
-        if not os.path.exists(storage_path):
-            os.makedirs(storage_path)
-            self.ix = FileStorage(storage_path).create_index(self.schema)
+        self._storage_path = get_path("search_index")
+        if not os.path.exists(self._storage_path):
+            os.makedirs(self._storage_path)
+            self.ix = FileStorage(self._storage_path).create_index(self.schema)
         else:
-            self.ix = FileStorage(storage_path).open_index()
+            self.ix = FileStorage(self._storage_path).open_index()
 
         self.logger = logging.getLogger("search")
 
@@ -88,6 +91,7 @@ class SearchEngine:
             self._batches_since_optimize += 1
 
     def _commit_documents(self, docs: Sequence[SearchDocument], optimize: bool):
+        started_at = time.perf_counter()
         writer = self.ix.writer()
         for doc in docs:
             doc_dict = doc.to_dict()
@@ -98,6 +102,8 @@ class SearchEngine:
             filtered_dict["raw"] = doc.text
             writer.update_document(**filtered_dict)
         writer.commit(optimize=optimize)
+        self.commits += 1
+        self.commit_seconds += time.perf_counter() - started_at
 
     def delete_by_address(self, address: str | Sequence[str]):
         addresses = [address] if isinstance(address, str) else list(address)
@@ -110,6 +116,14 @@ class SearchEngine:
         with self.__cache_lock:
             self._query_cache.clear()
 
+    def clear(self):
+        """Recreates empty index with current schema"""
+        with self.__lock:
+            self._index_queue = []
+            self.ix = FileStorage(self._storage_path).create_index(self.schema)
+        with self.__cache_lock:
+            self._query_cache.clear()
+
     def get_index_size(self) -> int:
         """Возвращает количество документов в индексе"""
         return self.ix.doc_count_all()
@@ -8,7 +8,9 @@ from src.api.app import Config
 from src.api.exceptions import NotIdentified, BadRequest
 from src.api.handlers import Request, render_template
 from src.config import CONFIG
-from src.core.data.queries import add_search_query, get_last_search_queries
+from src.core.data.pagination import CountCache
+from src.core.data.queries import get_last_search_queries
+from src.core.data.search_log import search_log
 from src.core.data.user_search_history import user_search_history
 from src.core.data.nods_and_peers import (
     count_nodes_filtered,
@@ -34,9 +36,20 @@ app = NomadAPI(
 )
 TIME_FORMAT = CONFIG.TIME_FORMAT
 DEFAULT_PAGE_SIZE = 20
+# totals for pagination, counting all matching rows on every page is a full scan
+_counts = CountCache(ttl_seconds=60)
 logger = logging.getLogger("views")
 
 
+def _invalidate_history_counts(identities: set[str]) -> None:
+    for identity in identities:
+        _counts.invalidate(("history", identity))
+
+
+search_log.on_history_flushed = _invalidate_history_counts
+search_log.start()
+
+
 @app.request("/page/index.mu")
 def index(r: Request):
     return render_template(
@@ -101,9 +114,12 @@ def nodes_mu(
         mentions_for: str = "",
         page: int = 0,
         page_size: int = DEFAULT_PAGE_SIZE,
+        after: str = "",
+        before: str = "",
 ):
     nodes_parsed = []
     items = []
+    prev_cursor = next_cursor = ""
     mentions_for_name = ""
     page, page_size = normalize_pagination(page, page_size)
 
@@ -119,13 +135,13 @@ def nodes_mu(
         start, end = get_page_bounds(page, page_size)
         for n in mention_nodes[start:end]:
             items.append((n["destination"], n))
-    elif query:
-        total_items = count_nodes_filtered(query=query)
-        for n in get_nodes_page(page=page, page_size=page_size, query=query):
-            items.append((n["destination"], n))
     else:
-        total_items = count_nodes_filtered()
-        for n in get_nodes_page(page=page, page_size=page_size):
+        total_items = _counts.get(("nodes", query), lambda: count_nodes_filtered(query=query))
+        nodes_page = get_nodes_page(
+            page=page, page_size=page_size, query=query, after=after, before=before
+        )
+        prev_cursor, next_cursor = nodes_page.prev_cursor, nodes_page.next_cursor
+        for n in nodes_page.items:
             items.append((n["destination"], n))
 
     for dst, n in items:
@@ -155,6 +171,8 @@ def nodes_mu(
             page=page,
             page_size=page_size,
             pages_total=calc_pages_total(total_items, page_size),
+            prev_cursor=prev_cursor,
+            next_cursor=next_cursor,
             mentions_for=mentions_for_name,
             query=query or "",
             now=now().strftime(TIME_FORMAT),
@@ -165,12 +183,20 @@ def nodes_mu(
 
 @app.request("/page/peers.mu")
 def peers_mu(
-        r: Request, query: str = "", page: int = 0, page_size: int = DEFAULT_PAGE_SIZE
+        r: Request,
+        query: str = "",
+        page: int = 0,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        after: str = "",
+        before: str = "",
 ):
     page, page_size = normalize_pagination(page, page_size)
     peers_parsed = []
-    total_items = count_peers_filtered(query=query)
-    for p in get_peers_page(page=page, page_size=page_size, query=query):
+    total_items = _counts.get(("peers", query), lambda: count_peers_filtered(query=query))
+    peers_page = get_peers_page(
+        page=page, page_size=page_size, query=query, after=after, before=before
+    )
+    for p in peers_page.items:
         last_online = datetime.datetime.fromtimestamp(
             p["time"], tz=datetime.timezone.utc
         )
@@ -189,6 +215,8 @@ def peers_mu(
             page=page,
             page_size=page_size,
             pages_total=calc_pages_total(total_items, page_size),
+            prev_cursor=peers_page.prev_cursor,
+            next_cursor=peers_page.next_cursor,
             query=query or "",
             now=now().strftime(TIME_FORMAT),
             peers=sorted(peers_parsed, key=lambda p: p["last_announce"], reverse=True),
@@ -221,8 +249,14 @@ def search(
 ):
     page, page_size = normalize_pagination(page, page_size)
     clean_query = replace_line_breaks(query).strip()
+    # written in background, response doesn't wait for database
+    searched_at = now().timestamp()
     if page == 0:
-        add_search_query(clean_query)
+        search_log.add_query(clean_query, searched_at)
+    try:
+        search_log.add_history(r.get_remote_identity(), clean_query, searched_at)
+    except NotIdentified:
+        pass
 
     entries_all = search_engine.query(query)
     total_items = len(entries_all)
@@ -233,16 +267,12 @@ def search(
         if e.time:
             last_online = datetime.datetime.fromtimestamp(e.time, tz=datetime.timezone.utc)
             e.since_announce = format_timedelta(since_online(last_online))
-        node_info = find_node_by_address(e.address)
-        if node_info:
-            e.name = node_info["name"] + " " + e.url.split(":")[1]
+        # ranker has already read nodes of results
+        if e.node_name:
+            e.name = e.node_name + " " + e.url.split(":")[1]
         else:
             e.name = e.url
 
-    try:
-        user_search_history.add(r.get_remote_identity(), clean_query, now().timestamp())
-    except NotIdentified:
-        pass
     return render_template(
         "search.mu",
         dict(
@@ -259,11 +289,21 @@ def search(
 
 
 @app.request("/page/history.mu", identifying_required=True)
-def history(r: Request, page: int = 0, page_size: int = DEFAULT_PAGE_SIZE):
+def history(
+        r: Request,
+        page: int = 0,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        after: str = "",
+        before: str = "",
+):
     page, page_size = normalize_pagination(page, page_size)
     remote_identity = r.get_remote_identity()
-    hist_cut = user_search_history.list(remote_identity, page=page, page_size=page_size)
-    total_items = user_search_history.count(remote_identity)
+    hist_page = user_search_history.list(
+        remote_identity, page=page, page_size=page_size, after=after, before=before
+    )
+    total_items = _counts.get(
+        ("history", remote_identity), lambda: user_search_history.count(remote_identity)
+    )
     return render_template(
         "history.mu",
         dict(
@@ -271,6 +311,8 @@ def history(r: Request, page: int = 0, page_size: int = DEFAULT_PAGE_SIZE):
             location_params="",
             page_size=page_size,
             pages_total=calc_pages_total(total_items, page_size),
+            prev_cursor=hist_page.prev_cursor,
+            next_cursor=hist_page.next_cursor,
             history=[
                 dict(
                     q=v["q"],
@@ -278,7 +320,7 @@ def history(r: Request, page: int = 0, page_size: int = DEFAULT_PAGE_SIZE):
                         v["time"], tz=datetime.timezone.utc
                     ),
                 )
-                for v in hist_cut
+                for v in hist_page.items
             ],
             total=total_items,
             page=page,